@@ -1,10 +1,22 @@
 # Gunicorn configuration file
+#
+#   sync (default):  gunicorn library_project.wsgi -c gunicorn_config.py
+#   ASGI:            ASGI_MODE=True gunicorn library_project.asgi:application -c gunicorn_config.py
 import multiprocessing
+import os
 
 bind = "0.0.0.0:8000"
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
 timeout = 30
 keepalive = 2
 max_requests = 1000
 max_requests_jitter = 50
+
+if os.environ.get("ASGI_MODE", "").lower() in ("1", "true", "yes", "on"):
+    # One event loop per process holds many slow connections at once, so
+    # there is no need for the 2n+1 oversubscription of sync workers
+    worker_class = "uvicorn.workers.UvicornWorker"
+    workers = multiprocessing.cpu_count() + 1
+    keepalive = 5
+else:
+    worker_class = "sync"
+    workers = multiprocessing.cpu_count() * 2 + 1
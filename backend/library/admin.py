@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Book, Member, IssueRecord
+from .models import (
+    Book, Member, IssueRecord, Reservation, BookDailyStats, MemberMonthlyStats,
+    LibraryDailyStats, BookRecommendation
+)
 
 
 @admin.register(Book)
@@ -21,3 +24,35 @@ class IssueRecordAdmin(admin.ModelAdmin):
     list_display = ['book', 'member', 'issue_date', 'due_date', 'return_date', 'status', 'fine_amount']
     list_filter = ['status', 'issue_date', 'due_date']
     search_fields = ['book__title', 'member__user__username', 'member__member_id']
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ['book', 'member', 'status', 'created_at', 'hold_expires_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['book__title', 'member__user__username', 'member__member_id']
+
+
+@admin.register(BookDailyStats)
+class BookDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['book', 'day', 'loans', 'returns', 'fines']
+    list_filter = ['day']
+    search_fields = ['book__title', 'book__isbn']
+
+
+@admin.register(MemberMonthlyStats)
+class MemberMonthlyStatsAdmin(admin.ModelAdmin):
+    list_display = ['member', 'month', 'loans', 'returns', 'fines']
+    list_filter = ['month']
+    search_fields = ['member__user__username', 'member__member_id']
+
+
+@admin.register(LibraryDailyStats)
+class LibraryDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['day', 'shard', 'loans', 'returns', 'fines']
+
+
+@admin.register(BookRecommendation)
+class BookRecommendationAdmin(admin.ModelAdmin):
+    list_display = ['book', 'rank', 'recommended', 'together', 'score']
+    search_fields = ['book__title', 'book__isbn']
@@ -0,0 +1,305 @@
+"""
+Circulation analytics served from incremental rollups.
+
+Three tables count loans, returns and fines collected:
+``BookDailyStats`` per book per day, ``MemberMonthlyStats`` per member per
+month, and ``LibraryDailyStats`` per day for the whole library, so the
+reports read a handful of rollup rows for the requested range instead of
+grouping the whole ``IssueRecord`` table. Loans count on their issue date;
+returns and fines count on their return date.
+
+The circulation paths hand their deltas to ``record_issues`` and
+``record_returns``, which merge them per row and apply them in a short
+transaction of their own once the loan has committed. The checkout and
+return transactions take no rollup locks. The library-wide total for a day
+is spread over ``LIBRARY_SHARDS`` rows, and each flush adds to a random one,
+so concurrent checkouts don't queue on a single row. If a flush fails after
+the loan committed, it is logged and ``rebuild()`` restores the totals.
+
+``rebuild()`` recomputes the tables from ``IssueRecord`` a month at a time.
+Use it after loading data outside the circulation paths or after editing
+loans in the admin.
+"""
+import random
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Max, Min, Sum, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Book, BookDailyStats, IssueRecord, LibraryDailyStats, MemberMonthlyStats
+
+COUNTERS = ('loans', 'returns', 'fines')
+DEFAULT_REPORT_DAYS = 30
+DEFAULT_REPORT_LIMIT = 10
+MAX_REPORT_LIMIT = 100
+REBUILD_BATCH_SIZE = 5000
+LIBRARY_SHARDS = 8
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _next_month(month):
+    return (month + timedelta(days=32)).replace(day=1)
+
+
+def _zero():
+    return {'loans': 0, 'returns': 0, 'fines': Decimal('0')}
+
+
+def _money(value):
+    """Decimal string, as the API renders ``fine_amount``"""
+    return str(Decimal(value or 0).quantize(Decimal('0.01')))
+
+
+def _per_owner(owner_field, amounts, output_field):
+    """CASE expression mapping each owner id to its change"""
+    return Case(
+        *[When(**{owner_field: owner_id}, then=Value(amount)) for owner_id, amount in amounts.items()],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+def _add(model, owner_field, period_field, deltas):
+    """Add ``{(owner_id, period): {counter: amount}}`` to rollup rows, creating the missing ones"""
+    by_period = defaultdict(dict)
+    for (owner_id, period), amounts in deltas.items():
+        by_period[period][owner_id] = amounts
+
+    for period, owners in sorted(by_period.items()):
+        rows = model.objects.filter(**{period_field: period, f'{owner_field}__in': owners})
+        changes = {}
+        for counter in COUNTERS:
+            amounts = {owner_id: amounts[counter] for owner_id, amounts in owners.items() if amounts.get(counter)}
+            if amounts:
+                changes[counter] = F(counter) + _per_owner(owner_field, amounts, model._meta.get_field(counter))
+        if not changes:
+            continue
+        # A single checkout's row usually exists already: one UPDATE
+        if len(owners) == 1 and rows.update(**changes):
+            continue
+        # Rows another transaction created meanwhile are kept and added to below
+        model.objects.bulk_create(
+            [model(**{owner_field: owner_id, period_field: period}) for owner_id in owners],
+            ignore_conflicts=True,
+        )
+        if len(owners) > 1:
+            # Lock in id order, so concurrent batches can't deadlock
+            list(rows.select_for_update().order_by(owner_field).values_list(owner_field, flat=True))
+        rows.update(**changes)
+
+
+def _add_library(deltas):
+    """Add ``{day: {counter: amount}}`` to one shard of the library-wide daily rows"""
+    shard = random.randrange(LIBRARY_SHARDS)
+    for day, amounts in sorted(deltas.items()):
+        rows = LibraryDailyStats.objects.filter(day=day, shard=shard)
+        changes = {counter: F(counter) + Value(amount) for counter, amount in amounts.items() if amount}
+        if changes and not rows.update(**changes):
+            LibraryDailyStats.objects.bulk_create([LibraryDailyStats(day=day, shard=shard)], ignore_conflicts=True)
+            rows.update(**changes)
+
+
+def _apply(books, members, days):
+    with transaction.atomic():
+        _add(BookDailyStats, 'book_id', 'day', books)
+        _add(MemberMonthlyStats, 'member_id', 'month', members)
+        # The busiest rows go last, so their locks are held shortest
+        _add_library(days)
+
+
+def record_issues(records):
+    """Count new loans on their issue date once the issuing transaction commits"""
+    books, members, days = Counter(), Counter(), Counter()
+    for record in records:
+        books[(record.book_id, record.issue_date)] += 1
+        members[(record.member_id, month_of(record.issue_date))] += 1
+        days[record.issue_date] += 1
+    transaction.on_commit(lambda: _apply(
+        {key: {'loans': count} for key, count in books.items()},
+        {key: {'loans': count} for key, count in members.items()},
+        {day: {'loans': count} for day, count in days.items()},
+    ), robust=True)
+
+
+def record_returns(records):
+    """Count returns and the fines they settled on their return date once the returning transaction commits"""
+    books, members, days = defaultdict(_zero), defaultdict(_zero), defaultdict(_zero)
+    for record in records:
+        for totals in (books[(record.book_id, record.return_date)],
+                       members[(record.member_id, month_of(record.return_date))],
+                       days[record.return_date]):
+            totals['returns'] += 1
+            totals['fines'] += Decimal(record.fine_amount)
+    transaction.on_commit(lambda: _apply(dict(books), dict(members), dict(days)), robust=True)
+
+
+def rebuild():
+    """Recompute the rollup tables from IssueRecord; returns the number of rows written per model"""
+    written = Counter()
+    with transaction.atomic():
+        for model in (BookDailyStats, MemberMonthlyStats, LibraryDailyStats):
+            model.objects.all().delete()
+
+        bounds = IssueRecord.objects.aggregate(
+            first=Min('issue_date'), last_issued=Max('issue_date'), last_returned=Max('return_date'),
+        )
+        if bounds['first'] is None:
+            return written
+        last = max(filter(None, (bounds['last_issued'], bounds['last_returned'])))
+
+        # One month of history in memory at a time
+        month = month_of(bounds['first'])
+        while month <= last:
+            following = _next_month(month)
+            issued = IssueRecord.objects.filter(issue_date__gte=month, issue_date__lt=following).order_by()
+            returned = IssueRecord.objects.filter(
+                status='returned', return_date__gte=month, return_date__lt=following,
+            ).order_by()
+
+            books, members, days = defaultdict(_zero), defaultdict(_zero), defaultdict(_zero)
+            for book_id, day, loans in (
+                issued.values('book_id', 'issue_date').annotate(count=Count('id'))
+                .values_list('book_id', 'issue_date', 'count')
+            ):
+                books[(book_id, day)]['loans'] = loans
+                days[day]['loans'] += loans
+            for book_id, day, returns, fines in (
+                returned.values('book_id', 'return_date').annotate(count=Count('id'), fines=Sum('fine_amount'))
+                .values_list('book_id', 'return_date', 'count', 'fines')
+            ):
+                books[(book_id, day)].update(returns=returns, fines=fines or 0)
+                days[day]['returns'] += returns
+                days[day]['fines'] += fines or 0
+            for member_id, loans in (
+                issued.values('member_id').annotate(count=Count('id')).values_list('member_id', 'count')
+            ):
+                members[member_id]['loans'] = loans
+            for member_id, returns, fines in (
+                returned.values('member_id').annotate(count=Count('id'), fines=Sum('fine_amount'))
+                .values_list('member_id', 'count', 'fines')
+            ):
+                members[member_id].update(returns=returns, fines=fines or 0)
+
+            for model, rows in (
+                (BookDailyStats, [BookDailyStats(book_id=book_id, day=day, **totals)
+                                  for (book_id, day), totals in books.items()]),
+                (MemberMonthlyStats, [MemberMonthlyStats(member_id=member_id, month=month, **totals)
+                                      for member_id, totals in members.items()]),
+                (LibraryDailyStats, [LibraryDailyStats(day=day, **totals) for day, totals in days.items()]),
+            ):
+                model.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+                written[model.__name__] += len(rows)
+            month = following
+
+    return written
+
+
+class ReportFilterSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False, help_text='Inclusive; defaults to 30 days before end')
+    end = serializers.DateField(required=False, help_text='Inclusive; defaults to today')
+    limit = serializers.IntegerField(min_value=1, max_value=MAX_REPORT_LIMIT, default=DEFAULT_REPORT_LIMIT)
+    interval = serializers.ChoiceField(choices=['day', 'month'], default='day')
+
+    def validate(self, attrs):
+        attrs['end'] = attrs.get('end') or timezone.now().date()
+        attrs['start'] = attrs.get('start') or attrs['end'] - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'start': ['Start must not be after end.']})
+        return attrs
+
+
+def popular_titles(start, end, limit=DEFAULT_REPORT_LIMIT):
+    """Most borrowed books between ``start`` and ``end``"""
+    # Rank book ids first and join titles for the top few only
+    top = list(
+        BookDailyStats.objects.filter(day__range=(start, end), loans__gt=0)
+        .values('book_id')
+        .annotate(total=Sum('loans'))
+        .order_by('-total', 'book_id')
+        .values_list('book_id', 'total')[:limit]
+    )
+    books = Book.objects.only('title', 'author', 'isbn').in_bulk([book_id for book_id, _ in top])
+    return [
+        {
+            'book_id': book_id,
+            'title': books[book_id].title,
+            'author': books[book_id].author,
+            'isbn': books[book_id].isbn,
+            'loans': loans,
+        }
+        for book_id, loans in top
+        if book_id in books
+    ]
+
+
+def active_members(start, end, limit=DEFAULT_REPORT_LIMIT):
+    """Members with the most loans in the months from ``start`` to ``end``"""
+    rows = (
+        MemberMonthlyStats.objects.filter(month__range=(month_of(start), month_of(end)), loans__gt=0)
+        .values('member_id', 'member__member_id', 'member__user__username',
+                'member__user__first_name', 'member__user__last_name')
+        .annotate(total_loans=Sum('loans'), total_returns=Sum('returns'), total_fines=Sum('fines'))
+        .order_by('-total_loans', 'member_id')[:limit]
+    )
+    return [
+        {
+            'member_id': row['member_id'],
+            'member_code': row['member__member_id'],
+            'username': row['member__user__username'],
+            'name': f"{row['member__user__first_name']} {row['member__user__last_name']}".strip(),
+            'loans': row['total_loans'],
+            'returns': row['total_returns'],
+            'fines': _money(row['total_fines']),
+        }
+        for row in rows
+    ]
+
+
+def _library_days(start, end):
+    """``{day: (loans, returns, fines)}`` for the days with any circulation, shards summed"""
+    return {
+        day: (loans, returns, fines)
+        for day, loans, returns, fines in LibraryDailyStats.objects.filter(day__range=(start, end))
+        .values('day')
+        .annotate(total_loans=Sum('loans'), total_returns=Sum('returns'), total_fines=Sum('fines'))
+        .values_list('day', 'total_loans', 'total_returns', 'total_fines')
+    }
+
+
+def loans_per_day(start, end):
+    """Loans, returns and fines collected for every day from ``start`` to ``end``, zeros included"""
+    days = _library_days(start, end)
+    results = []
+    day = start
+    while day <= end:
+        loans, returns, fines = days.get(day, (0, 0, 0))
+        results.append({'day': day, 'loans': loans, 'returns': returns, 'fines': _money(fines)})
+        day += timedelta(days=1)
+    return results
+
+
+def fine_revenue(start, end, interval='day'):
+    """Fines collected per day, or per month for the months from ``start`` to ``end``"""
+    if interval == 'day':
+        return [
+            {'period': row['day'], 'returns': row['returns'], 'fines': row['fines']}
+            for row in loans_per_day(start, end)
+        ]
+    first, last = month_of(start), _next_month(month_of(end)) - timedelta(days=1)
+    months = defaultdict(_zero)
+    for day, (_, returns, fines) in _library_days(first, last).items():
+        months[month_of(day)]['returns'] += returns
+        months[month_of(day)]['fines'] += fines
+    results = []
+    month = first
+    while month <= last:
+        results.append({'period': month, 'returns': months[month]['returns'], 'fines': _money(months[month]['fines'])})
+        month = _next_month(month)
+    return results
@@ -0,0 +1,235 @@
+"""
+Async read endpoints for ASGI deployments (``ASGI_MODE``).
+
+Plain GETs of the book and issue record list/detail routes are answered here
+through the async ORM, so one worker can serve many slow clients without
+holding a thread per request. Rows go through the same compiled serializers,
+pagination and response cache as the DRF viewsets, so responses are
+identical. Everything else is handed to the DRF viewset in a thread: writes,
+the browsable API, streaming, unusual credentials and any error response.
+
+``availability_stream`` is ASGI-only: it holds a connection open per client,
+which only an event loop can afford.
+"""
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.urls import URLPattern
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from . import availability, caching
+from .authentication import CachedJWTAuthentication
+from .fastpath import FastJSONRenderer, compiled
+from .fieldsets import parse_fieldset
+from .models import Book, IssueRecord
+from .pagination import LibraryPagination
+from .search import search_books
+from .views import BookViewSet, IssueRecordViewSet
+
+
+class Fallback(Exception):
+    """Hand the request to the DRF view"""
+
+
+def accepts_json(request, format=None):
+    if request.method != 'GET' or 'stream' in request.GET:
+        return False
+    if (format or request.GET.get('format', 'json')) != 'json':
+        return False
+    return 'text/html' not in request.headers.get('Accept', '')
+
+
+async def authenticate(request, required):
+    """JWT user for the request; anything JWT can't settle is left to DRF"""
+    if 'HTTP_AUTHORIZATION' not in request.META:
+        if required:
+            raise Fallback
+        return None
+    try:
+        result = await sync_to_async(CachedJWTAuthentication().authenticate)(request)
+    except APIException:
+        raise Fallback
+    if result is None:
+        raise Fallback
+    return result[0]
+
+
+def json_response(data):
+    response = HttpResponse(FastJSONRenderer().render(data), content_type='application/json')
+    response['Vary'] = 'Accept'
+    return response
+
+
+async def paginated_rows(request, queryset, viewset):
+    serializer = compiled(viewset.serializer_class, parse_fieldset(request.query_params))
+    ordering = viewset.keyset_ordering.lstrip('-')
+    paginator = LibraryPagination()
+    page = await paginator.apaginate_queryset(serializer.values(queryset, 'id', ordering), request, viewset)
+    if page is None:
+        return serializer.many([row async for row in serializer.values(queryset)])
+    return paginator.get_paginated_response(serializer.many(page)).data
+
+
+async def single_row(request, queryset, viewset, pk):
+    serializer = compiled(viewset.serializer_class, parse_fieldset(request.query_params))
+    row = await serializer.values(queryset.filter(pk=pk)).afirst()
+    if row is None:
+        raise Fallback  # DRF renders the 404
+    return serializer.to_representation(row)
+
+
+async def cached(request, action, lookup, build):
+    """Async counterpart of ``CachedResponseMixin.cached_response``; shares its entries"""
+    cache = caching.get_cache()
+    key = await sync_to_async(caching.response_cache_key)(action, lookup, request.query_params)
+    entry = await cache.aget(key)
+    if entry is None:
+        entry = caching.make_entry(await build())
+        await cache.aset(key, entry, caching.response_cache_timeout())
+
+    if caching.not_modified(request.headers, entry):
+        response = HttpResponse(status=304)
+    else:
+        response = json_response(entry['data'])
+    return caching.set_validators(response, entry)
+
+
+async def book_list(request):
+    await authenticate(request, required=False)
+
+    async def build():
+        queryset = Book.objects.all()
+        search = request.query_params.get('search')
+        if search:
+            queryset = await sync_to_async(search_books)(queryset, search)
+        return await paginated_rows(request, queryset, BookViewSet)
+    return await cached(request, 'list', '', build)
+
+
+async def book_available(request):
+    await authenticate(request, required=False)
+
+    async def build():
+        return await paginated_rows(request, Book.objects.filter(available_copies__gt=0), BookViewSet)
+    return await cached(request, 'available', '', build)
+
+
+async def book_detail(request, pk):
+    await authenticate(request, required=False)
+    return await cached(request, 'retrieve', pk, lambda: single_row(request, Book.objects.all(), BookViewSet, pk))
+
+
+async def issue_list(request):
+    await authenticate(request, required=True)
+    queryset = IssueRecord.objects.all()
+    status_filter = request.query_params.get('status')
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    return json_response(await paginated_rows(request, queryset, IssueRecordViewSet))
+
+
+async def issue_detail(request, pk):
+    await authenticate(request, required=True)
+    return json_response(await single_row(request, IssueRecord.objects.all(), IssueRecordViewSet, pk))
+
+
+MAX_STREAM_BOOKS = 500
+KEEPALIVE_SECONDS = 15
+# Streams are closed after this long and EventSource reconnects, so a client
+# that vanished without the server noticing is only held this long
+STREAM_SECONDS = 300
+RETRY_MS = 3000
+
+
+def sse_event(event, data):
+    payload = json.dumps({str(book_id): count for book_id, count in data.items()}, separators=(',', ':'))
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+async def availability_events(book_ids):
+    subscription = availability.broker.subscribe(book_ids)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        # Subscribed first, so nothing committed after the snapshot is missed
+        if book_ids is not None:
+            rows = Book.objects.filter(id__in=book_ids).values_list('id', 'available_copies')
+            yield sse_event('snapshot', {book_id: count async for book_id, count in rows})
+
+        deadline = time.monotonic() + STREAM_SECONDS
+        while time.monotonic() < deadline:
+            changes = await subscription.get(min(KEEPALIVE_SECONDS, deadline - time.monotonic()))
+            if subscription.overflowed:
+                yield sse_event('resync', {})
+                return
+            yield ': keepalive\n\n' if changes is None else sse_event('availability', changes)
+    finally:
+        availability.broker.unsubscribe(subscription)
+
+
+async def availability_stream(request):
+    """
+    Server-sent ``availability`` events of ``{book_id: available_copies}``.
+    ``?books=1,2,3`` limits the stream to those books and starts it with a
+    ``snapshot`` of their counts. A ``resync`` event means changes were
+    dropped and the client should refetch.
+    """
+    book_ids = None
+    if request.GET.get('books'):
+        try:
+            book_ids = frozenset(int(part) for part in request.GET['books'].split(',') if part.strip())
+        except ValueError:
+            return HttpResponseBadRequest('books must be a comma-separated list of ids')
+        if len(book_ids) > MAX_STREAM_BOOKS:
+            return HttpResponseBadRequest(f'At most {MAX_STREAM_BOOKS} books per stream')
+
+    response = StreamingHttpResponse(availability_events(book_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+
+HANDLERS = {
+    'book-list': book_list,
+    'book-available': book_available,
+    'book-detail': book_detail,
+    'issue-list': issue_list,
+    'issue-detail': issue_detail,
+}
+
+
+def async_view(handler, drf_view):
+    fallback = sync_to_async(drf_view)
+
+    async def view(request, *args, format=None, **kwargs):
+        if accepts_json(request, format):
+            try:
+                return await handler(Request(request), *args, **kwargs)
+            except (Fallback, APIException, ValueError, ValidationError):
+                pass
+        if format is not None:
+            kwargs['format'] = format
+        return await fallback(request, *args, **kwargs)
+
+    # Keep what the router, CSRF middleware and request metrics read off the view
+    view.csrf_exempt = True
+    view.cls = drf_view.cls
+    view.actions = drf_view.actions
+    view.initkwargs = drf_view.initkwargs
+    return view
+
+
+def async_urlpatterns(router_urls):
+    """
+    The router's routes with the book and issue reads pointed at the async
+    handlers. Order is kept so ``books/<pk>/`` can't shadow ``books/typeahead/``.
+    """
+    return [
+        URLPattern(pattern.pattern, async_view(HANDLERS[pattern.name], pattern.callback),
+                   pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in HANDLERS else pattern
+        for pattern in router_urls
+    ]
@@ -0,0 +1,120 @@
+"""
+JWT authentication with an in-process user cache.
+
+``JWTAuthentication`` loads the user row on every request, and views that
+need ``request.user.member`` load that too. ``CachedJWTAuthentication`` loads
+both with one query and keeps them for ``JWT_USER_CACHE_TTL`` seconds, keyed
+by user id and the user's auth version. The version lives in the response
+cache and is bumped whenever the user or their member profile is saved or
+deleted. With a shared CACHE_BACKEND every worker drops its copy on the next
+request; under the default locmem only the worker that made the change
+does, and the others keep theirs for up to the TTL.
+
+The cached member is for identifying the member. Its active_loans and
+outstanding_fines are not kept current, since circulation changes them with
+``update()``, which sends no signal, so views that show or check them read
+the row again.
+"""
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .caching import get_cache
+
+MAX_CACHED_USERS = 10000
+
+Entry = namedtuple('Entry', ['version', 'expires', 'user'])
+
+_users = OrderedDict()
+_lock = threading.Lock()
+
+
+def cache_ttl():
+    return getattr(settings, 'JWT_USER_CACHE_TTL', 0)
+
+
+def version_key(user_id):
+    return f'library:auth:{user_id}:version'
+
+
+def auth_version(user_id):
+    cache = get_cache()
+    version = cache.get(version_key(user_id))
+    if version is None:
+        # A fresh random version, so entries cached before the shared cache
+        # lost the key can't match
+        cache.add(version_key(user_id), uuid.uuid4().int >> 96, None)
+        version = cache.get(version_key(user_id))
+    return version
+
+
+def _bump(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(version_key(user_id))
+    except ValueError:
+        pass  # nobody has cached this user under a version yet
+
+
+def user_changed(user_id):
+    """Drop every worker's cached copy of the user once the transaction commits"""
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def _detached(user):
+    """A copy per request, so views can't change what other requests see"""
+    user = copy.copy(user)
+    member = user._state.fields_cache.get('member')
+    if member is not None:
+        user._state.fields_cache['member'] = copy.copy(member)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        ttl = cache_ttl()
+        if not ttl:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        version = auth_version(user_id)
+        now = time.monotonic()
+        with _lock:
+            entry = _users.get(user_id)
+        if entry is None or entry.version != version or entry.expires < now:
+            # The member profile comes along in the same query
+            user = (
+                self.user_model.objects.select_related('member')
+                .filter(**{api_settings.USER_ID_FIELD: user_id})
+                .first()
+            )
+            entry = Entry(version, now + ttl, user)
+            with _lock:
+                _users[user_id] = entry
+                _users.move_to_end(user_id)
+                while len(_users) > MAX_CACHED_USERS:
+                    _users.popitem(last=False)
+
+        user = entry.user
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return _detached(user)
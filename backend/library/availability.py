@@ -0,0 +1,145 @@
+"""
+Live ``available_copies`` updates for the availability event stream.
+
+Circulation publishes ``{book_id: available_copies}`` once a checkout or
+return commits. The in-process ``broker`` fans each change out to one
+bounded queue per subscriber, dropping the books a subscriber did not ask
+for. Subscribers live on the ASGI event loop; publishers are request
+threads, so delivery goes through ``call_soon_threadsafe``.
+
+With ``AVAILABILITY_RELAY`` on (redis only, whose INCR numbers the entries
+atomically across processes), changes are also appended to a short log in
+the cache, and a relay thread in each process that has subscribers forwards
+the entries other processes wrote, so every worker sees every change.
+"""
+import asyncio
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+
+from .caching import get_cache
+
+SEQUENCE_KEY = 'library:availability:sequence'
+EVENT_TTL = 300
+QUEUE_SIZE = 256
+RELAY_INTERVAL = 1.0
+
+
+def event_key(sequence):
+    return f'library:availability:event:{sequence}'
+
+
+def relay_enabled():
+    return getattr(settings, 'AVAILABILITY_RELAY', False)
+
+
+class Subscription:
+    """One stream's queue; ``book_ids`` of None means every book"""
+
+    def __init__(self, loop, book_ids=None):
+        self.loop = loop
+        self.book_ids = book_ids
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, changes):
+        """Runs on the subscriber's loop"""
+        if self.book_ids is not None:
+            changes = {book_id: count for book_id, count in changes.items() if book_id in self.book_ids}
+        if not changes:
+            return
+        try:
+            self.queue.put_nowait(changes)
+        except asyncio.QueueFull:
+            # A client this far behind gets told to refetch instead
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """Next batch of changes, or None after ``timeout`` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.origin = uuid.uuid4().hex
+        self.relay = None
+
+    def subscribe(self, book_ids=None):
+        """Register a subscription on the running event loop"""
+        subscription = Subscription(asyncio.get_running_loop(), book_ids)
+        with self.lock:
+            self.subscriptions.add(subscription)
+            if relay_enabled() and self.relay is None:
+                self.relay = threading.Thread(target=self._relay, name='availability-relay', daemon=True)
+                self.relay.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self.subscriptions)
+
+    def publish(self, changes):
+        """Deliver ``{book_id: available_copies}`` here and, via the cache log, to other processes"""
+        if relay_enabled():
+            self._append(changes)
+        self._deliver(changes)
+
+    def _deliver(self, changes):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, changes)
+            except RuntimeError:
+                self.unsubscribe(subscription)  # its loop has closed
+
+    def _append(self, changes):
+        cache = get_cache()
+        try:
+            sequence = cache.incr(SEQUENCE_KEY)
+        except ValueError:
+            cache.add(SEQUENCE_KEY, 0, None)
+            sequence = cache.incr(SEQUENCE_KEY)
+        cache.set(event_key(sequence), (self.origin, changes), EVENT_TTL)
+
+    def _relay(self):
+        cache = get_cache()
+        seen = cache.get(SEQUENCE_KEY, 0)
+        while True:
+            time.sleep(RELAY_INTERVAL)
+            with self.lock:
+                if not self.subscriptions:
+                    self.relay = None
+                    return
+            latest = cache.get(SEQUENCE_KEY, 0)
+            if latest < seen:
+                seen = latest  # the cache was cleared
+            if latest == seen:
+                continue
+            events = cache.get_many([event_key(sequence) for sequence in range(seen + 1, latest + 1)])
+            for sequence in range(seen + 1, latest + 1):
+                origin, changes = events.get(event_key(sequence), (self.origin, None))
+                if origin != self.origin:
+                    self._deliver(changes)
+            seen = latest
+
+
+broker = Broker()
+
+
+def changed(counts):
+    """Publish new copy counts once the surrounding transaction commits"""
+    if counts and (relay_enabled() or broker.has_subscribers()):
+        counts = dict(counts)
+        transaction.on_commit(lambda: broker.publish(counts))
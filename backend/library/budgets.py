@@ -0,0 +1,40 @@
+"""
+Per-endpoint query budgets.
+
+Viewsets declare ``query_budget = {action: max_queries}``. When
+``QUERY_BUDGET_CHECKS`` is on, every request to a budgeted action is counted
+and overruns are logged, or raised when ``QUERY_BUDGET_STRICT`` is set.
+"""
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudgetMixin:
+    query_budget = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        if not getattr(settings, 'QUERY_BUDGET_CHECKS', False):
+            return super().dispatch(request, *args, **kwargs)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = super().dispatch(request, *args, **kwargs)
+
+        budget = self.query_budget.get(getattr(self, 'action', None))
+        if budget is not None and len(queries) > budget:
+            message = (
+                f"{self.__class__.__name__}.{self.action} ran {len(queries)} queries "
+                f"(budget {budget}) for {request.method} {request.path}"
+            )
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
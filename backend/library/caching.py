@@ -0,0 +1,118 @@
+"""
+Read-through response cache for the public book endpoints.
+
+Cached entries are keyed on the action, the object id and the normalized
+query string, prefixed with a generation counter. Any change to a book or an
+issue record bumps the generation, which orphans every cached entry at once
+without having to track individual keys. Entries also carry an ETag and a
+Last-Modified derived from the books' ``updated_at`` so clients can get 304s.
+
+The generation lives in the cache itself, so a bump only reaches the
+workers that share it. Under the default per-process locmem backend, other
+workers keep serving their entries until RESPONSE_CACHE_TIMEOUT expires them.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+GENERATION_KEY = 'library:books:generation'
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def response_cache_timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def current_generation():
+    cache = get_cache()
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def _bump():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, None)
+
+
+def bump_generation():
+    """Invalidate every cached book response once the transaction commits"""
+    transaction.on_commit(_bump)
+
+
+def _validators(data):
+    """ETag and Last-Modified from the ids and updated_at of the books in ``data``"""
+    rows = data.get('results', [data]) if isinstance(data, dict) else data
+    # Sparse fieldsets may leave out updated_at; the row itself stands in for it
+    stamps = [(row.get('id'), row.get('updated_at', row)) for row in rows if isinstance(row, dict)]
+    digest = hashlib.md5(repr((data.get('count') if isinstance(data, dict) else None, stamps)).encode())
+    modified = [parse_datetime(stamp) for _, stamp in stamps if isinstance(stamp, str)]
+    return f'"{digest.hexdigest()}"', max(modified).timestamp() if modified else None
+
+
+def response_cache_key(action, lookup, query_params):
+    params = sorted((key, value) for key in query_params for value in query_params.getlist(key))
+    query = hashlib.md5(urlencode(params).encode()).hexdigest()
+    return f'library:books:{current_generation()}:{action}:{lookup}:{query}'
+
+
+def make_entry(data):
+    etag, last_modified = _validators(data)
+    return {'data': data, 'etag': etag, 'last_modified': last_modified}
+
+
+def not_modified(headers, entry):
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return entry['etag'] in tags or '*' in tags
+    since = parse_http_date_safe(headers.get('If-Modified-Since', ''))
+    return since is not None and entry['last_modified'] is not None and int(entry['last_modified']) <= since
+
+
+def set_validators(response, entry):
+    response['ETag'] = entry['etag']
+    if entry['last_modified'] is not None:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    return response
+
+
+class CachedResponseMixin:
+    def response_cache_key(self):
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, '')
+        return response_cache_key(self.action, lookup, self.request.query_params)
+
+    def cached_response(self, build):
+        if 'stream' in self.request.query_params:
+            return build()
+
+        cache = get_cache()
+        key = self.response_cache_key()
+        entry = cache.get(key)
+        if entry is None:
+            response = build()
+            if response.status_code != status.HTTP_200_OK or not hasattr(response, 'data'):
+                return response
+            entry = make_entry(response.data)
+            cache.set(key, entry, response_cache_timeout())
+
+        if not_modified(self.request.headers, entry):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        return set_validators(response, entry)
@@ -0,0 +1,318 @@
+"""
+Streaming catalog import.
+
+CSV, NDJSON and MARC-like text files are parsed one record at a time, so
+memory stays flat however large the file is. Rows are validated, then
+upserted on ``isbn`` in batches with ``bulk_create(update_conflicts=True)``.
+Bad rows go to the error report and the rest of the file carries on.
+
+``bulk_create`` skips ``Book.save``, so the ``available_copies <=
+total_copies`` clamp is applied here. The file's ``available_copies`` only
+seeds new books. For books already in the catalog, copies out on loan or
+on the hold shelf stay out: a new total of N with K copies out leaves
+N - K available. Added copies go through the reservation queue like a
+returned copy, so waiting members get holds before any reach the shelf.
+"""
+import csv
+import json
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import availability, caching, circulation, search, stats, typeahead
+from .models import Book
+
+FORMATS = ('csv', 'ndjson', 'marc')
+IMPORT_FIELDS = ('title', 'author', 'isbn', 'publication_date', 'total_copies', 'available_copies', 'description')
+UPDATE_FIELDS = ['title', 'author', 'publication_date', 'total_copies', 'available_copies', 'description', 'updated_at']
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+YEAR_RE = re.compile(r'\d{4}')
+
+
+class CatalogRowSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=200)
+    author = serializers.CharField(max_length=100)
+    isbn = serializers.CharField(max_length=20)
+    publication_date = serializers.DateField(required=False, allow_null=True)
+    total_copies = serializers.IntegerField(min_value=0, default=1)
+    available_copies = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    description = serializers.CharField(allow_blank=True, default='')
+
+    def validate_isbn(self, value):
+        isbn = search.normalize_isbn(value)
+        if not isbn or len(isbn) > 13:
+            raise serializers.ValidationError('Enter an ISBN of at most 13 characters.')
+        return isbn
+
+
+@dataclass
+class ImportResult:
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    # Rows whose available_copies exceeded total_copies
+    clamped: int = 0
+    seconds: float = 0.0
+    errors: list = field(default_factory=list)
+
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    if name.endswith(('.mrk', '.marc', '.mrc.txt')):
+        return 'marc'
+    return 'csv'
+
+
+def _clean(record):
+    """Known fields only; blank values count as missing"""
+    return {
+        name: value.strip() if isinstance(value, str) else value
+        for name, value in record.items()
+        if name in IMPORT_FIELDS and value not in ('', None)
+    }
+
+
+def parse_csv(stream):
+    """Yield ``(line, record)`` from a CSV file with a header row"""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for record in reader:
+        yield reader.line_num, _clean(record)
+
+
+def parse_ndjson(stream):
+    """Yield ``(line, record)`` from one JSON object per line"""
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as exc:
+            yield line, ValueError(f'Invalid JSON: {exc}')
+            continue
+        if not isinstance(record, dict):
+            yield line, ValueError('Expected a JSON object.')
+            continue
+        yield line, _clean(record)
+
+
+def _subfields(value):
+    """``{code: text}`` from a mnemonic MARC data field, first occurrence wins"""
+    codes = {}
+    for part in value[2:].split('$')[1:]:
+        if part:
+            codes.setdefault(part[0], part[1:].strip())
+    return codes
+
+
+def _marc_record(fields):
+    def first(tag, code):
+        for value in fields.get(tag, ()):
+            text = _subfields(value).get(code)
+            if text:
+                return text
+        return None
+
+    record = {}
+    title = first('245', 'a')
+    if title:
+        subtitle = first('245', 'b')
+        record['title'] = f"{title.rstrip(' /:;')}: {subtitle}" if subtitle else title
+        record['title'] = record['title'].rstrip(' /:;,.')
+    author = first('100', 'a') or first('110', 'a')
+    if author:
+        record['author'] = author.rstrip(' ,.')
+    isbn = first('020', 'a')
+    if isbn:
+        record['isbn'] = isbn.split()[0]
+    published = first('264', 'c') or first('260', 'c')
+    year = YEAR_RE.search(published or '')
+    if year:
+        record['publication_date'] = date(int(year.group()), 1, 1).isoformat()
+    description = first('520', 'a')
+    if description:
+        record['description'] = description
+    # Local holdings field: $c total copies, $a copies on the shelf
+    for code, name in (('c', 'total_copies'), ('a', 'available_copies')):
+        value = first('999', code)
+        if value:
+            record[name] = value
+    return record
+
+
+def parse_marc(stream):
+    """
+    Yield ``(line, record)`` from MARC mnemonic text (``=245  10$aTitle``),
+    one record per ``=LDR`` line or blank-line-separated block.
+    """
+    fields, start = {}, None
+    for line, text in enumerate(stream, 1):
+        text = text.rstrip('\r\n')
+        if not text.strip() or text.startswith('=LDR'):
+            if fields:
+                yield start, _marc_record(fields)
+            fields, start = {}, None
+            if not text.startswith('=LDR'):
+                continue
+        if start is None:
+            start = line
+        if text.startswith('=') and len(text) > 6:
+            fields.setdefault(text[1:4], []).append(text[6:])
+    if fields:
+        yield start, _marc_record(fields)
+
+
+PARSERS = {'csv': parse_csv, 'ndjson': parse_ndjson, 'marc': parse_marc}
+
+
+def _error_entry(line, record, errors):
+    if isinstance(errors, dict):
+        errors = {name: [str(error) for error in details] for name, details in errors.items()}
+    else:
+        errors = {'non_field_errors': [str(errors)]}
+    isbn = record.get('isbn') if isinstance(record, dict) else None
+    return {'line': line, 'isbn': isbn, 'errors': errors}
+
+
+class CatalogImport:
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, on_error=None):
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.result = ImportResult()
+
+    def fail(self, line, record, errors):
+        entry = _error_entry(line, record, errors)
+        self.result.failed += 1
+        if len(self.result.errors) < MAX_REPORTED_ERRORS:
+            self.result.errors.append(entry)
+        if self.on_error is not None:
+            self.on_error(entry)
+
+    def run(self, records):
+        started = time.monotonic()
+        batch = []
+        for line, record in self.readable(records):
+            self.result.rows += 1
+            batch.append((line, record))
+            if len(batch) >= self.batch_size:
+                self.flush(self.validate(batch))
+                batch = []
+        if batch:
+            self.flush(self.validate(batch))
+
+        if self.result.created or self.result.updated:
+            with transaction.atomic():
+                search.rebuild_index()
+            stats.invalidate()
+            caching.bump_generation()
+            typeahead.books.invalidate()
+        self.result.seconds = time.monotonic() - started
+        return self.result
+
+    def validate(self, batch):
+        """Valid rows of ``batch``; the rest go to the error report"""
+        # One serializer for the whole batch, as ListSerializer does, instead
+        # of rebuilding the field set for every row
+        validator = CatalogRowSerializer()
+        valid = []
+        for line, record in batch:
+            if isinstance(record, Exception):
+                self.fail(line, None, record)
+                continue
+            try:
+                valid.append((line, validator.run_validation(record)))
+            except serializers.ValidationError as exc:
+                self.fail(line, record, exc.detail)
+        return valid
+
+    def readable(self, records):
+        """Stop at an undecodable or malformed file, keeping the batches already read"""
+        try:
+            yield from records
+        except (UnicodeDecodeError, csv.Error) as exc:
+            self.fail(None, None, f'Stopped reading the file: {exc}')
+
+    def flush(self, batch):
+        if not batch:
+            return
+        try:
+            self.upsert(batch)
+        except DatabaseError as exc:
+            if len(batch) == 1:
+                line, data = batch[0]
+                self.fail(line, data, exc)
+                return
+            # Find the offending rows one at a time; the others still go in
+            for row in batch:
+                self.flush([row])
+
+    def upsert(self, batch):
+        # Later rows for the same ISBN win, as they would across batches
+        rows = {data['isbn']: data for _, data in batch}
+        clamped = created = 0
+        with transaction.atomic():
+            existing = {
+                isbn: (pk, total, available)
+                for pk, isbn, total, available in Book.objects.select_for_update()
+                .filter(isbn__in=rows)
+                .values_list('id', 'isbn', 'total_copies', 'available_copies')
+            }
+            books, counts, added = [], {}, Counter()
+            for isbn, data in rows.items():
+                total = data['total_copies']
+                if isbn in existing:
+                    pk, old_total, old_available = existing[isbn]
+                    if total > old_total:
+                        # Shelved below, after the queue has taken its holds
+                        added[pk] = total - old_total
+                        available = old_available
+                    else:
+                        available = max(0, total - (old_total - old_available))
+                        if available != old_available:
+                            counts[pk] = available
+                else:
+                    created += 1
+                    available = data.get('available_copies')
+                    if available is None:
+                        available = total
+                    elif available > total:
+                        available = total
+                        clamped += 1
+                books.append(Book(
+                    title=data['title'],
+                    author=data['author'],
+                    isbn=isbn,
+                    publication_date=data.get('publication_date'),
+                    total_copies=total,
+                    available_copies=available,
+                    description=data['description'],
+                ))
+            Book.objects.bulk_create(
+                books, update_conflicts=True, unique_fields=['isbn'], update_fields=UPDATE_FIELDS,
+            )
+            if added:
+                shelved = circulation._restock(added, timezone.now())
+                counts.update(
+                    Book.objects.filter(id__in=shelved).values_list('id', 'available_copies')
+                )
+            availability.changed(counts)
+        self.result.created += created
+        self.result.updated += len(rows) - created
+        self.result.clamped += clamped
+
+
+def import_catalog(stream, fmt, batch_size=DEFAULT_BATCH_SIZE, on_error=None):
+    """Import books from a text ``stream`` in ``fmt``; returns an ImportResult"""
+    return CatalogImport(batch_size, on_error).run(PARSERS[fmt](stream))
@@ -0,0 +1,551 @@
+"""
+Checkout and return engine.
+
+Each operation runs in a single transaction. Copy counts are changed with
+conditional ``F()`` updates so concurrent checkouts cannot oversell a book,
+and duplicate active loans are rejected by the ``unique_active_loan``
+constraint rather than a racy read-then-insert check.
+
+Books with no copy on the shelf can be reserved. A returned copy goes to the
+head of the book's FIFO reservation queue as a hold for ``HOLD_PERIOD``
+instead of back on the shelf, and only that member can check it out. Every
+queue change locks the book's row first, so allocation, cancellation and
+expiry of the same book's holds are serialized.
+
+A single checkout runs seven statements in its transaction and a return
+eight. Their analytics rollup deltas are applied after the commit, in a
+short transaction of their own of usually three more statements
+(``analytics.record_issues`` / ``record_returns``).
+
+Each member carries ``active_loans`` and ``outstanding_fines`` counters,
+kept in step by the same transactions (and by the overdue sweeper for
+fines). Checkouts test the policy limits against them with a conditional
+UPDATE instead of counting the member's loans. ``member_counter_drift()``
+and ``repair_member_counters()`` compare them with the loans and fix them.
+"""
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import analytics, availability, caching
+from .models import Book, Member, IssueRecord, Reservation
+
+LOAN_PERIOD = timedelta(days=14)
+HOLD_PERIOD = timedelta(days=3)
+REPAIR_BATCH_SIZE = 500
+
+
+def max_active_loans():
+    return getattr(settings, 'MAX_ACTIVE_LOANS', 0)
+
+
+def max_outstanding_fines():
+    return getattr(settings, 'MAX_OUTSTANDING_FINES', None)
+
+
+def _money_field():
+    return DecimalField(max_digits=10, decimal_places=2)
+
+
+def _policy_error(active_loans, outstanding_fines):
+    """Why a member with these counters may not borrow another book, or None"""
+    fines_limit = max_outstanding_fines()
+    if fines_limit is not None and outstanding_fines > fines_limit:
+        return f'Member owes ${outstanding_fines} in fines; borrowing is blocked above ${fines_limit}.'
+    limit = max_active_loans()
+    if limit and active_loans >= limit:
+        return f'Member already has {active_loans} books on loan; the limit is {limit}.'
+    return None
+
+
+def _count_loan(member):
+    """Add a loan to the member's counters if the checkout policy allows it"""
+    allowed = Member.objects.filter(id=member.id)
+    limit = max_active_loans()
+    if limit:
+        allowed = allowed.filter(active_loans__lt=limit)
+    fines_limit = max_outstanding_fines()
+    if fines_limit is not None:
+        allowed = allowed.filter(outstanding_fines__lte=fines_limit)
+    # Test and increment in one statement, so concurrent checkouts can't
+    # both slip under the limit
+    counted = allowed.update(active_loans=F('active_loans') + 1)
+    member.refresh_from_db(fields=['active_loans', 'outstanding_fines'])
+    if not counted:
+        error = _policy_error(member.active_loans, member.outstanding_fines) or 'Member may not borrow more books.'
+        raise serializers.ValidationError({'member_id': [error]})
+
+
+def _release_loans(loans, fines):
+    """Take returned loans (a Counter per member id) and the fines they carried off the members' counters"""
+    changes = {'active_loans': Greatest(F('active_loans') - _per_id_delta(loans), Value(0))}
+    fines = {member_id: amount for member_id, amount in fines.items() if amount}
+    if fines:
+        changes['outstanding_fines'] = Greatest(
+            F('outstanding_fines') - _per_id_delta(fines, _money_field()), Value(Decimal('0')),
+            output_field=_money_field(),
+        )
+    Member.objects.filter(id__in=loans).update(**changes)
+
+
+def issue_book(book_id, member_id, due_date=None):
+    """Issue one copy of a book to a member and return the new IssueRecord"""
+    today = timezone.now().date()
+    due_date = due_date or today + LOAN_PERIOD
+
+    try:
+        with transaction.atomic():
+            member = Member.objects.select_related('user').filter(id=member_id, is_active=True).first()
+            if member is None:
+                raise serializers.ValidationError({'member_id': ['Member not found or inactive.']})
+
+            # A copy set aside for this member comes off the hold shelf, not the open shelf
+            hold = (
+                Reservation.objects.select_for_update()
+                .filter(book_id=book_id, member=member, status='ready')
+                .first()
+            )
+            if hold is not None:
+                hold.status = 'fulfilled'
+                hold.save(update_fields=['status', 'updated_at'])
+            else:
+                taken = Book.objects.filter(id=book_id, available_copies__gt=0).update(
+                    available_copies=F('available_copies') - 1,
+                    updated_at=timezone.now(),
+                )
+                if not taken:
+                    if Book.objects.filter(id=book_id).exists():
+                        raise serializers.ValidationError({'book_id': ['No copies available for this book.']})
+                    raise serializers.ValidationError({'book_id': ['Book not found.']})
+
+            _count_loan(member)
+            book = Book.objects.get(id=book_id)
+            issue_record = IssueRecord.objects.create(book=book, member=member, due_date=due_date)
+            analytics.record_issues([issue_record])
+            if hold is None:
+                availability.changed({book.id: book.available_copies})
+    except IntegrityError:
+        raise serializers.ValidationError({'non_field_errors': ['Member already has this book issued.']})
+
+    return issue_record
+
+
+def return_book(issue_record_id):
+    """Mark an active loan as returned, settle its fine and free the copy"""
+    today = timezone.now().date()
+
+    with transaction.atomic():
+        issue_record = (
+            IssueRecord.objects.select_for_update(of=('self',))
+            .select_related('book', 'member__user')
+            .filter(id=issue_record_id, status__in=IssueRecord.ACTIVE_STATUSES)
+            .first()
+        )
+        if issue_record is None:
+            raise serializers.ValidationError(
+                {'issue_record_id': ['Issue record not found or already returned.']}
+            )
+
+        owed = issue_record.fine_amount
+        issue_record.fine_amount = issue_record.fine_as_of(today)
+        issue_record.return_date = today
+        issue_record.status = 'returned'
+        issue_record.save(update_fields=['fine_amount', 'return_date', 'status', 'updated_at'])
+
+        shelved = _restock(Counter([issue_record.book_id]), timezone.now())
+        issue_record.book.refresh_from_db(fields=['available_copies', 'updated_at'])
+        _release_loans(Counter([issue_record.member_id]), {issue_record.member_id: owed})
+        issue_record.member.refresh_from_db(fields=['active_loans', 'outstanding_fines'])
+        analytics.record_returns([issue_record])
+        if shelved:
+            availability.changed({issue_record.book_id: issue_record.book.available_copies})
+
+    return issue_record
+
+
+def _per_id_delta(deltas, output_field=None):
+    """CASE expression mapping each row id to its change"""
+    return Case(
+        *[When(id=pk, then=Value(delta)) for pk, delta in deltas.items()],
+        default=Value(0),
+        output_field=output_field or IntegerField(),
+    )
+
+
+def _lock_books(book_ids):
+    """Row-lock books in id order, so concurrent lockers can't deadlock"""
+    list(Book.objects.select_for_update().filter(id__in=book_ids).order_by('id').values_list('id', flat=True))
+
+
+def _lock_members(member_ids):
+    """Row-lock members in id order; callers lock books first"""
+    list(Member.objects.select_for_update().filter(id__in=member_ids).order_by('id').values_list('id', flat=True))
+
+
+def _allocate_holds(freed, now):
+    """
+    Turn up to ``freed[book_id]`` of each book's oldest waiting reservations
+    into holds. Callers hold the books' row locks. Returns the number of
+    copies placed on hold per book.
+    """
+    chosen = []
+    for book_id, copies in freed.items():
+        # Reads the head of the queue straight off reservation_queue_idx
+        chosen += (
+            Reservation.objects.filter(book_id=book_id, status='waiting')
+            .order_by('created_at', 'id')
+            .values_list('id', 'book_id')[:copies]
+        )
+    if chosen:
+        Reservation.objects.filter(id__in=[pk for pk, _ in chosen]).update(
+            status='ready', ready_at=now, hold_expires_at=now + HOLD_PERIOD, updated_at=now,
+        )
+    return Counter(book_id for _, book_id in chosen)
+
+
+def _restock(freed, now):
+    """
+    Give ``freed`` copies (a Counter of book id -> copies) to waiting
+    reservations first and put the rest back on the shelf. Returns the
+    Counter of copies that went back on the shelf.
+    """
+    _lock_books(freed)
+    shelved = freed - _allocate_holds(freed, now)
+    if shelved:
+        Book.objects.filter(id__in=shelved).update(
+            available_copies=Least(F('available_copies') + _per_id_delta(shelved), F('total_copies')),
+            updated_at=now,
+        )
+    return shelved
+
+
+def _create_loans(pending):
+    """
+    Insert the ``(index, hold, IssueRecord)`` entries and return them with
+    the record set to None where ``unique_active_loan`` refused it, e.g.
+    because a concurrent single issue got there first.
+    """
+    try:
+        with transaction.atomic():
+            IssueRecord.objects.bulk_create([record for _, _, record in pending])
+        return pending
+    except IntegrityError:
+        pass
+    # One savepoint per row, so only the offending items fail
+    inserted = []
+    for index, hold, record in pending:
+        record.pk = None
+        try:
+            with transaction.atomic():
+                IssueRecord.objects.bulk_create([record])
+        except IntegrityError:
+            record = None
+        inserted.append((index, hold, record))
+    return inserted
+
+
+def issue_books(items):
+    """
+    Issue a batch of ``{'book_id', 'member_id', 'due_date'}`` items.
+
+    Everything is validated with set-based lookups and applied in one
+    transaction; returns one ``(issue_record, errors)`` pair per item in
+    input order, where exactly one of the two is ``None``.
+    """
+    today = timezone.now().date()
+    book_ids = {item['book_id'] for item in items}
+    member_ids = {item['member_id'] for item in items}
+    results = [None] * len(items)
+
+    with transaction.atomic():
+        books = Book.objects.select_for_update().in_bulk(book_ids)
+        _lock_members(member_ids)
+        members = Member.objects.select_related('user').filter(is_active=True).in_bulk(member_ids)
+        active = set(
+            IssueRecord.objects.filter(
+                book_id__in=book_ids, member_id__in=member_ids,
+                status__in=IssueRecord.ACTIVE_STATUSES,
+            ).values_list('book_id', 'member_id')
+        )
+        holds = {
+            (book_id, member_id): pk
+            for pk, book_id, member_id in Reservation.objects.select_for_update()
+            .filter(book_id__in=book_ids, member_id__in=member_ids, status='ready')
+            .values_list('id', 'book_id', 'member_id')
+        }
+
+        remaining = {book_id: book.available_copies for book_id, book in books.items()}
+        borrowed = Counter()
+        pending = []
+        for index, item in enumerate(items):
+            book_id, member_id = item['book_id'], item['member_id']
+            member = members.get(member_id)
+            # The members are locked, so their counters plus this batch's loans are current
+            refused = member and _policy_error(member.active_loans + borrowed[member_id], member.outstanding_fines)
+            if book_id not in books:
+                results[index] = (None, {'book_id': ['Book not found.']})
+            elif member_id not in members:
+                results[index] = (None, {'member_id': ['Member not found or inactive.']})
+            elif (book_id, member_id) in active:
+                # Also catches a pair repeated within the batch
+                results[index] = (None, {'non_field_errors': ['Member already has this book issued.']})
+            elif refused:
+                results[index] = (None, {'member_id': [refused]})
+            elif (book_id, member_id) not in holds and remaining[book_id] <= 0:
+                results[index] = (None, {'book_id': ['No copies available for this book.']})
+            else:
+                hold = holds.get((book_id, member_id))
+                if hold is None:
+                    remaining[book_id] -= 1
+                borrowed[member_id] += 1
+                active.add((book_id, member_id))
+                pending.append((index, hold, IssueRecord(
+                    book=books[book_id],
+                    member=members[member_id],
+                    due_date=item.get('due_date') or today + LOAN_PERIOD,
+                )))
+
+        created = []
+        if pending:
+            for index, hold, record in _create_loans(pending):
+                if record is None:
+                    results[index] = (None, {'non_field_errors': ['Member already has this book issued.']})
+                else:
+                    results[index] = (record, None)
+                    created.append((hold, record))
+
+        if created:
+            now = timezone.now()
+            taken = Counter(record.book_id for hold, record in created if hold is None)
+            fulfilled = [hold for hold, _ in created if hold is not None]
+            borrowed = Counter(record.member_id for _, record in created)
+            if taken:
+                Book.objects.filter(id__in=taken).update(
+                    available_copies=F('available_copies') - _per_id_delta(taken),
+                    updated_at=now,
+                )
+            if fulfilled:
+                Reservation.objects.filter(id__in=fulfilled).update(status='fulfilled', updated_at=now)
+            Member.objects.filter(id__in=borrowed).update(active_loans=F('active_loans') + _per_id_delta(borrowed))
+            for member_id, count in borrowed.items():
+                members[member_id].active_loans += count
+            for book_id, count in taken.items():
+                books[book_id].available_copies -= count
+                books[book_id].updated_at = now
+            analytics.record_issues([record for _, record in created])
+            caching.bump_generation()
+            availability.changed({book_id: books[book_id].available_copies for book_id in taken})
+
+    return results
+
+
+def return_books(issue_record_ids):
+    """
+    Return a batch of active loans by id.
+
+    Returns one ``(issue_record, errors)`` pair per id in input order.
+    """
+    today = timezone.now().date()
+    results = [None] * len(issue_record_ids)
+
+    with transaction.atomic():
+        records = (
+            IssueRecord.objects.select_for_update(of=('self',))
+            .select_related('book', 'member__user')
+            .filter(status__in=IssueRecord.ACTIVE_STATUSES)
+            .in_bulk(set(issue_record_ids))
+        )
+
+        now = timezone.now()
+        freed = Counter()
+        loans = Counter()
+        owed = Counter()
+        returned = []
+        for index, record_id in enumerate(issue_record_ids):
+            record = records.pop(record_id, None)
+            if record is None:
+                results[index] = (None, {'issue_record_id': ['Issue record not found or already returned.']})
+                continue
+            owed[record.member_id] += record.fine_amount
+            record.fine_amount = record.fine_as_of(today)
+            record.return_date = today
+            record.status = 'returned'
+            record.updated_at = now
+            freed[record.book_id] += 1
+            loans[record.member_id] += 1
+            returned.append(record)
+            results[index] = (record, None)
+
+        if returned:
+            IssueRecord.objects.bulk_update(returned, ['fine_amount', 'return_date', 'status', 'updated_at'])
+            shelved = _restock(freed, now)
+            counts = dict(Book.objects.filter(id__in=freed).values_list('id', 'available_copies'))
+            for record in returned:
+                record.book.available_copies = counts[record.book_id]
+                record.book.updated_at = now
+            _release_loans(loans, owed)
+            counters = {
+                pk: (active_loans, outstanding_fines)
+                for pk, active_loans, outstanding_fines in Member.objects.filter(id__in=loans)
+                .values_list('id', 'active_loans', 'outstanding_fines')
+            }
+            for record in returned:
+                record.member.active_loans, record.member.outstanding_fines = counters[record.member_id]
+            analytics.record_returns(returned)
+            caching.bump_generation()
+            availability.changed({book_id: counts[book_id] for book_id in shelved})
+
+    return results
+
+
+def with_queue_position(queryset):
+    """
+    Annotate ``queue_position`` (1 = next in line) on waiting reservations;
+    None for the rest. Each position is a range count on reservation_queue_idx.
+    """
+    ahead = (
+        Reservation.objects.filter(book=OuterRef('book'), status='waiting')
+        .filter(Q(created_at__lt=OuterRef('created_at')) | Q(created_at=OuterRef('created_at'), id__lt=OuterRef('id')))
+        .order_by()
+        .values('book')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return queryset.annotate(queue_position=Case(
+        When(status='waiting', then=Coalesce(Subquery(ahead), 0) + 1),
+        default=None,
+        output_field=IntegerField(),
+    ))
+
+
+def reserve_book(book_id, member_id):
+    """Add a member to the end of a book's reservation queue; returns the Reservation"""
+    try:
+        with transaction.atomic():
+            _lock_books([book_id])
+            book = Book.objects.filter(id=book_id).first()
+            if book is None:
+                raise serializers.ValidationError({'book_id': ['Book not found.']})
+            member = Member.objects.select_related('user').filter(id=member_id, is_active=True).first()
+            if member is None:
+                raise serializers.ValidationError({'member_id': ['Member not found or inactive.']})
+            if book.available_copies > 0:
+                raise serializers.ValidationError({'book_id': ['Copies are available; issue the book instead.']})
+            if IssueRecord.objects.filter(
+                book=book, member=member, status__in=IssueRecord.ACTIVE_STATUSES
+            ).exists():
+                raise serializers.ValidationError({'non_field_errors': ['Member already has this book issued.']})
+
+            reservation = Reservation.objects.create(book=book, member=member)
+            # The book is locked, so nobody can join or leave the queue meanwhile
+            reservation.queue_position = Reservation.objects.filter(book=book, status='waiting').count()
+    except IntegrityError:
+        raise serializers.ValidationError({'non_field_errors': ['Member already has this book reserved.']})
+
+    return reservation
+
+
+def cancel_reservation(reservation_id):
+    """Leave a queue or give up a hold; a held copy passes to the next in line"""
+    with transaction.atomic():
+        book_id = (
+            Reservation.objects.filter(id=reservation_id, status__in=Reservation.ACTIVE_STATUSES)
+            .values_list('book_id', flat=True)
+            .first()
+        )
+        if book_id is not None:
+            _lock_books([book_id])
+        reservation = (
+            Reservation.objects.select_related('book', 'member__user')
+            .filter(id=reservation_id, status__in=Reservation.ACTIVE_STATUSES)
+            .first()
+        )
+        if reservation is None:
+            raise serializers.ValidationError(
+                {'reservation_id': ['Reservation not found or no longer active.']}
+            )
+
+        was_held = reservation.status == 'ready'
+        reservation.status = 'cancelled'
+        reservation.save(update_fields=['status', 'updated_at'])
+        reservation.queue_position = None
+        if was_held and _restock(Counter([book_id]), timezone.now()):
+            reservation.book.refresh_from_db(fields=['available_copies', 'updated_at'])
+            caching.bump_generation()
+            availability.changed({book_id: reservation.book.available_copies})
+
+    return reservation
+
+
+def expire_holds(now=None):
+    """Expire holds nobody collected in time and pass their copies on; returns how many expired"""
+    now = now or timezone.now()
+    overdue = Reservation.objects.filter(status='ready', hold_expires_at__lte=now)
+
+    with transaction.atomic():
+        _lock_books(set(overdue.values_list('book_id', flat=True)))
+        # Re-read under the locks: a hold may have been collected meanwhile
+        expired = list(overdue.select_for_update().values_list('id', 'book_id'))
+        if not expired:
+            return 0
+        Reservation.objects.filter(id__in=[pk for pk, _ in expired]).update(status='expired', updated_at=now)
+        shelved = _restock(Counter(book_id for _, book_id in expired), now)
+        if shelved:
+            caching.bump_generation()
+            availability.changed(dict(Book.objects.filter(id__in=shelved).values_list('id', 'available_copies')))
+
+    return len(expired)
+
+
+def _actual_counters():
+    """Subquery expressions recounting a member's active loans and the fines on them"""
+    loans = (
+        IssueRecord.objects.filter(member=OuterRef('pk'), status__in=IssueRecord.ACTIVE_STATUSES)
+        .order_by()
+        .values('member')
+    )
+    return {
+        'active_loans': Coalesce(Subquery(loans.annotate(count=Count('id')).values('count')), 0),
+        'outstanding_fines': Coalesce(
+            Subquery(loans.annotate(total=Sum('fine_amount')).values('total')),
+            Value(Decimal('0')),
+            output_field=_money_field(),
+        ),
+    }
+
+
+def member_counter_drift():
+    """
+    ``(member pk, member_id, stored loans, actual loans, stored fines,
+    actual fines)`` for every member whose counters disagree with their loans
+    """
+    actual = _actual_counters()
+    return list(
+        Member.objects.annotate(actual_loans=actual['active_loans'], actual_fines=actual['outstanding_fines'])
+        .filter(~Q(active_loans=F('actual_loans')) | ~Q(outstanding_fines=F('actual_fines')))
+        .order_by('id')
+        .values_list('id', 'member_id', 'active_loans', 'actual_loans', 'outstanding_fines', 'actual_fines')
+    )
+
+
+def repair_member_counters(member_ids=None, batch_size=REPAIR_BATCH_SIZE):
+    """Recount the counters of the given members (all members by default) from their loans"""
+    if member_ids is None:
+        member_ids = Member.objects.order_by('id').values_list('id', flat=True)
+    member_ids = sorted(member_ids)
+    repaired = 0
+    for start in range(0, len(member_ids), batch_size):
+        batch = member_ids[start:start + batch_size]
+        with transaction.atomic():
+            # Circulation changes to these members wait for the locks, and the
+            # recount runs after the ones already in flight have committed
+            _lock_members(batch)
+            repaired += Member.objects.filter(id__in=batch).update(**_actual_counters())
+    return repaired
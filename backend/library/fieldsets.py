@@ -0,0 +1,167 @@
+"""
+Sparse fieldsets for read endpoints.
+
+``?fields=id,title,book.title`` limits the payload to the listed fields and
+``?expand=member.user`` embeds related objects. A dotted field implies that
+its parent is expanded. Once either parameter is given, nested objects that
+were not expanded collapse to their primary key. Without them, responses are
+unchanged.
+
+The same fieldset narrows the SQL: ``only()`` plus ``select_related()`` for
+model instances, and the ``values()`` lookups on the compiled fast path.
+"""
+from collections import namedtuple
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+# ``fields`` is a frozenset of names (None means all), ``expand`` a sorted
+# tuple of (name, Fieldset) pairs. Both are hashable so compiled plans can
+# be cached per fieldset.
+Fieldset = namedtuple('Fieldset', ['fields', 'expand'])
+
+COLLAPSED = 'collapsed'
+MAX_PARAM_LENGTH = 1000
+
+
+def _split(value):
+    return [part.strip() for part in (value or '')[:MAX_PARAM_LENGTH].split(',') if part.strip()]
+
+
+def _freeze(node):
+    fields = None if node['fields'] is None else frozenset(node['fields'])
+    expand = tuple(sorted((name, _freeze(child)) for name, child in node['expand'].items()))
+    return Fieldset(fields, expand)
+
+
+def parse_fieldset(query_params):
+    """Fieldset from ``?fields=``/``?expand=``, or None when neither is given"""
+    fields, expand = _split(query_params.get('fields')), _split(query_params.get('expand'))
+    if not fields and not expand:
+        return None
+
+    root = {'fields': set() if fields else None, 'expand': {}}
+    for path in fields:
+        node = root
+        *parents, leaf = path.split('.')
+        for name in parents:
+            if node['fields'] is not None:
+                node['fields'].add(name)
+            node = node['expand'].setdefault(name, {'fields': None, 'expand': {}})
+            if node['fields'] is None:
+                node['fields'] = set()
+        node['fields'].add(leaf)
+    for path in expand:
+        node = root
+        for name in path.split('.'):
+            node = node['expand'].setdefault(name, {'fields': None, 'expand': {}})
+    return _freeze(root)
+
+
+def resolve(serializer, fieldset, prefix=''):
+    """
+    Yield ``(name, field, child)`` for each readable field that ``fieldset``
+    keeps. ``child`` is None for plain fields, the nested fieldset for a
+    serializer field (None again when no fieldset was requested) and
+    ``COLLAPSED`` for a serializer field that should render as its id.
+    """
+    readable = {name: field for name, field in serializer.fields.items() if not field.write_only}
+    if fieldset is None:
+        for name, field in readable.items():
+            yield name, field, None
+        return
+
+    expand = dict(fieldset.expand)
+    requested = set(expand) if fieldset.fields is None else fieldset.fields | set(expand)
+    errors = [f"Unknown field '{prefix}{name}'." for name in sorted(requested - set(readable))]
+    errors += [
+        f"Field '{prefix}{name}' cannot be expanded." for name in sorted(expand)
+        if name in readable and not isinstance(readable[name], serializers.BaseSerializer)
+    ]
+    if errors:
+        raise serializers.ValidationError({'fields': errors})
+
+    for name, field in readable.items():
+        if fieldset.fields is not None and name not in fieldset.fields:
+            continue
+        if not isinstance(field, serializers.BaseSerializer):
+            yield name, field, None
+        else:
+            yield name, field, expand.get(name, COLLAPSED)
+
+
+def prune_serializer(serializer, fieldset, prefix=''):
+    """Drop unrequested read fields from ``serializer`` and collapse unexpanded nesting"""
+    if fieldset is None:
+        return serializer
+    kept = list(resolve(serializer, fieldset, prefix))
+    names = {name for name, _, _ in kept}
+    for name in [name for name, field in serializer.fields.items() if not field.write_only and name not in names]:
+        del serializer.fields[name]
+    for name, field, child in kept:
+        if child is COLLAPSED:
+            source = {} if field.source == name else {'source': field.source}
+            serializer.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **source)
+        elif child is not None:
+            prune_serializer(field, child, f'{prefix}{name}.')
+    return serializer
+
+
+def _only_fields(serializer, fieldset, prefix, only, related, label=''):
+    model_fields = {field.name for field in serializer.Meta.model._meta.concrete_fields}
+    narrowable = True
+    for name, field, child in resolve(serializer, fieldset, label):
+        path = prefix + field.source.replace('.', '__')
+        if field.source not in model_fields and not isinstance(field, serializers.BaseSerializer):
+            narrowable = False  # a property or method; can't tell which columns it reads
+        elif child is None or child is COLLAPSED:
+            only.append(path)
+        else:
+            related.append(path)
+            narrowable &= _only_fields(field, child, path + '__', only, related, f'{label}{name}.')
+    return narrowable
+
+
+def narrow_queryset(queryset, serializer, fieldset, *extra):
+    """
+    Load only the columns and joins ``fieldset`` needs. ``extra`` names
+    columns that must be loaded anyway, such as the keyset ordering field.
+    """
+    if fieldset is None:
+        return queryset
+    only, related = list(extra), []
+    narrowable = _only_fields(serializer, fieldset, '', only, related)
+    queryset = queryset.select_related(None)
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*only) if narrowable else queryset
+
+
+class SparseFieldsetMixin:
+    """Applies ``?fields=`` and ``?expand=`` to read requests"""
+    sparse_actions = ('list', 'retrieve')
+
+    def get_fieldset(self):
+        if self.request.method not in SAFE_METHODS:
+            return None
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = parse_fieldset(self.request.query_params)
+        return self._fieldset
+
+    def apply_fieldset(self, serializer):
+        prune_serializer(getattr(serializer, 'child', serializer), self.get_fieldset())
+        return serializer
+
+    def sparse_queryset(self, queryset, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        ordering = getattr(self, 'keyset_ordering', '-id').lstrip('-')
+        return narrow_queryset(queryset, serializer_class(), self.get_fieldset(), ordering)
+
+    def get_serializer(self, *args, **kwargs):
+        return self.apply_fieldset(super().get_serializer(*args, **kwargs))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.sparse_actions:
+            queryset = self.sparse_queryset(queryset)
+        return queryset
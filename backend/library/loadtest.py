@@ -0,0 +1,185 @@
+"""
+Helpers for driving the API in-process for benchmarks and load tests.
+
+Requests go through the real WSGI (or ASGI) application, so URL routing,
+middleware, authentication and rendering are all part of what is measured.
+"""
+import asyncio
+import io
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.db import connection
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+class WSGIClient:
+    """Minimal WSGI caller; one instance per thread"""
+
+    def __init__(self, application, host='localhost'):
+        self.application = application
+        self.host = host
+        self.token = None
+
+    def request(self, method, path, params=None, data=None, read_delay=0):
+        query = urlencode(params or {})
+        body = json.dumps(data).encode() if data is not None else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': self.host,
+            'SERVER_PORT': '80',
+            'HTTP_HOST': self.host,
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if self.token:
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {self.token}'
+
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split(' ', 1)[0]))
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+            if read_delay:
+                # A slow client keeps the sync worker busy until it has read everything
+                time.sleep(read_delay)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0], content
+
+
+class ASGIClient:
+    """Minimal ASGI caller; many can run concurrently on one event loop"""
+
+    def __init__(self, application, host='localhost'):
+        self.application = application
+        self.host = host
+        self.token = None
+
+    async def request(self, method, path, params=None, data=None, read_delay=0):
+        body = json.dumps(data).encode() if data is not None else b''
+        headers = [
+            (b'host', self.host.encode()),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ]
+        if self.token:
+            headers.append((b'authorization', f'Bearer {self.token}'.encode()))
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': urlencode(params or {}).encode(),
+            'root_path': '',
+            'headers': headers,
+            'client': ('127.0.0.1', 0),
+            'server': (self.host, 80),
+        }
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        status, chunks = [], []
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # Connection stays open until the response is sent
+            await asyncio.Future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if read_delay and not message.get('more_body'):
+                    # A slow client only holds this coroutine, not the worker
+                    await asyncio.sleep(read_delay)
+
+        await self.application(scope, receive, send)
+        return status[0], b''.join(chunks)
+
+
+class Recorder:
+    """Thread-safe collection of per-request timings and query counts"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []
+        self.errors = 0
+
+    def timed(self, client, method, path, params=None, data=None, ok=(200, 201)):
+        connection.force_debug_cursor = True
+        started = time.perf_counter()
+        status, content = client.request(method, path, params, data)
+        elapsed = (time.perf_counter() - started) * 1000
+        # request_started resets the query log, so it now holds just this request
+        queries = len(connection.queries_log)
+        with self.lock:
+            self.samples.append((elapsed, queries if status in ok else None))
+            if status not in ok:
+                self.errors += 1
+        return status, content
+
+    def summary(self, wall_seconds):
+        timings = sorted(sample[0] for sample in self.samples)
+        # Failed requests (e.g. SQLite lock timeouts) would skew the query count
+        queries = [sample[1] for sample in self.samples if sample[1] is not None]
+        return {
+            'requests': len(timings),
+            'errors': self.errors,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3) if timings else 0.0,
+            'throughput_rps': round(len(timings) / wall_seconds, 1) if wall_seconds else 0.0,
+            'queries_per_request': round(statistics.fmean(queries), 2) if queries else 0.0,
+        }
+
+
+def run_concurrently(worker, clients, total):
+    """Run ``worker(index)`` ``total`` times across ``clients`` threads; returns wall seconds"""
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def loop():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                break
+            worker(index)
+        connection.close()
+
+    threads = [threading.Thread(target=loop) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
@@ -0,0 +1,179 @@
+"""
+Management command to load-test the library API through the WSGI app.
+
+Run it against a seeded, disposable database (see ``generate_load_data``):
+the issue/return scenarios create and close real loans. The requests are
+made as a throwaway non-staff user with a random password, deleted when the
+run ends.
+"""
+import json
+import random
+import secrets
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from library.loadtest import Recorder, WSGIClient, run_concurrently
+from library.models import Book, Member
+from library_project.wsgi import application
+
+SCENARIOS = ['search', 'available', 'issue', 'return', 'token']
+SEARCH_TERMS = ['shadow', 'river gar', 'golden', 'orwell', 'the', 'mount', 'secret city', '978']
+BENCH_USERNAME_PREFIX = 'api-benchmark-'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main API routes with concurrent clients and report latency percentiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent client threads')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against a previous JSON result')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.20,
+            help='Allowed relative p95 slowdown versus the baseline before failing',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.clients = options['clients']
+        self.total = options['requests']
+        self.local = threading.local()
+        self.opened = []
+        self.opened_lock = threading.Lock()
+        self.credentials = {
+            'username': BENCH_USERNAME_PREFIX + secrets.token_hex(4),
+            'password': secrets.token_urlsafe(24),
+        }
+        user = User.objects.create_user(**self.credentials)
+        try:
+            self.token = self.login()
+            self.benchmark(options)
+        finally:
+            user.delete()
+
+    def benchmark(self, options):
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['localhost']):
+            for name in options['scenarios']:
+                self.stdout.write(f'Running {name} ({self.total} requests, {self.clients} clients)...')
+                results[name] = getattr(self, f'scenario_{name}')()
+                self.report(name, results[name])
+
+        document = {
+            'meta': {
+                'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                'clients': self.clients,
+                'requests': self.total,
+                'database': settings.DATABASES['default']['ENGINE'],
+                'books': Book.objects.count(),
+                'members': Member.objects.count(),
+            },
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(document, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def login(self):
+        client = WSGIClient(application)
+        with override_settings(ALLOWED_HOSTS=['localhost']):
+            status, content = client.request('POST', '/api/token/', data=self.credentials)
+        if status != 200:
+            raise CommandError(f'Could not obtain a token for the benchmark user ({status})')
+        return json.loads(content)['access']
+
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = WSGIClient(application)
+            self.local.client.token = self.token
+        return self.local.client
+
+    def run(self, worker):
+        recorder = Recorder()
+        wall = run_concurrently(lambda index: worker(recorder, index), self.clients, self.total)
+        return recorder.summary(wall)
+
+    def scenario_search(self):
+        return self.run(lambda recorder, index: recorder.timed(
+            self.client(), 'GET', '/api/books/', {'search': SEARCH_TERMS[index % len(SEARCH_TERMS)]}
+        ))
+
+    def scenario_available(self):
+        return self.run(lambda recorder, index: recorder.timed(
+            self.client(), 'GET', '/api/books/available/', {'page': index % 5 + 1}, ok=(200, 404)
+        ))
+
+    def scenario_issue(self):
+        books = list(Book.objects.filter(available_copies__gt=0).values_list('id', flat=True)[:5000])
+        members = list(Member.objects.filter(is_active=True).values_list('id', flat=True)[:5000])
+        if not (books and members):
+            raise CommandError('The issue scenario needs books with copies and active members; seed data first')
+        pairs = [(self.rng.choice(books), self.rng.choice(members)) for _ in range(self.total)]
+
+        def worker(recorder, index):
+            book_id, member_id = pairs[index]
+            status, content = recorder.timed(
+                self.client(), 'POST', '/api/issues/issue/',
+                data={'book_id': book_id, 'member_id': member_id}, ok=(201, 400),
+            )
+            if status == 201:
+                with self.opened_lock:
+                    self.opened.append(json.loads(content)['id'])
+
+        return self.run(worker)
+
+    def scenario_return(self):
+        if not self.opened:
+            raise CommandError('The return scenario returns loans opened by the issue scenario; run both')
+        opened = list(self.opened)
+        total = self.total
+        self.total = min(total, len(opened))
+        try:
+            return self.run(lambda recorder, index: recorder.timed(
+                self.client(), 'POST', '/api/issues/return_book/', data={'issue_record_id': opened[index]}
+            ))
+        finally:
+            self.total = total
+
+    def scenario_token(self):
+        return self.run(lambda recorder, index: recorder.timed(
+            self.client(), 'POST', '/api/token/', data=self.credentials
+        ))
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"  {name}: p50 {result['p50_ms']:.1f}ms  p95 {result['p95_ms']:.1f}ms  "
+            f"p99 {result['p99_ms']:.1f}ms  {result['throughput_rps']:.1f} req/s  "
+            f"{result['queries_per_request']:.1f} queries/req  {result['errors']} errors"
+        )
+
+    def compare(self, results, baseline_path, tolerance):
+        with open(baseline_path) as handle:
+            baseline = json.load(handle)['scenarios']
+
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+            if result['queries_per_request'] > before['queries_per_request'] + 0.5:
+                regressions.append(
+                    f"{name}: queries/request {before['queries_per_request']} -> {result['queries_per_request']}"
+                )
+
+        if regressions:
+            raise CommandError('Performance regressions against baseline:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
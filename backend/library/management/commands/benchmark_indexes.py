@@ -0,0 +1,151 @@
+"""
+Management command to benchmark the hot queries with and without the
+composite/partial indexes declared on the library models.
+
+Everything runs inside a transaction that is rolled back, so the optional
+seed data and the temporarily dropped indexes never persist. Until then the
+transaction holds the write lock: on SQLite that blocks other writers, on
+other databases ``DROP INDEX`` locks each table against reads and writes too.
+So the command only runs on SQLite unless ``--allow-table-locks`` is given;
+use that on a copy of the database, never one serving traffic.
+"""
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from library.models import Book, Member, IssueRecord
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Show query plans and timings for the hot queries before and after the library indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed-books', type=int, default=0, help='Temporary books to seed first')
+        parser.add_argument('--seed-members', type=int, default=0, help='Temporary members to seed first')
+        parser.add_argument('--seed-loans', type=int, default=0, help='Temporary issue records to seed first')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--plans', action='store_true', help='Print full query plans')
+        parser.add_argument(
+            '--allow-table-locks', action='store_true',
+            help='Run on a non-SQLite database even though dropping the indexes locks its tables',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite' and not options['allow_table_locks']:
+            raise CommandError(
+                f'Dropping the indexes locks the {connection.vendor} tables until the benchmark ends; '
+                'run it against a copy of the database with --allow-table-locks'
+            )
+        self.repeat = options['repeat']
+        self.show_plans = options['plans']
+        try:
+            with transaction.atomic():
+                self.seed(options['seed_books'], options['seed_members'], options['seed_loans'])
+                queries = self.hot_queries()
+                with_indexes = self.measure(queries, 'indexed')
+                self.drop_indexes()
+                without_indexes = self.measure(queries, 'no index')
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write('')
+        self.stdout.write(f"{'query':<28} {'no index (ms)':>14} {'indexed (ms)':>14} {'speedup':>9}")
+        for name in queries:
+            before, after = without_indexes[name]['ms'], with_indexes[name]['ms']
+            speedup = before / after if after else float('inf')
+            self.stdout.write(f'{name:<28} {before:>14.3f} {after:>14.3f} {speedup:>8.1f}x')
+            if self.show_plans:
+                self.stdout.write(f"  before: {without_indexes[name]['plan']}")
+                self.stdout.write(f"  after:  {with_indexes[name]['plan']}")
+
+    def seed(self, books, members, loans):
+        if not (books or members or loans):
+            return
+        self.stdout.write(f'Seeding {books} books, {members} members, {loans} loans (rolled back afterwards)...')
+        Book.objects.bulk_create(
+            [
+                Book(title=f'Benchmark {i}', author=f'Author {i % 997}', isbn=f'BM{i:011d}',
+                     total_copies=3, available_copies=i % 4 and 3)
+                for i in range(books)
+            ],
+            batch_size=5000,
+        )
+        users = User.objects.bulk_create(
+            [User(username=f'benchmark-{i}', password='!') for i in range(members)], batch_size=5000
+        )
+        Member.objects.bulk_create(
+            [Member(user=user, member_id=f'BM{i:08d}', is_active=i % 10 != 0) for i, user in enumerate(users)],
+            batch_size=5000,
+        )
+        book_ids = list(Book.objects.values_list('id', flat=True))
+        member_ids = list(Member.objects.values_list('id', flat=True))
+        if not (book_ids and member_ids):
+            return
+        today = date.today()
+        records, seen = [], set()
+        for i in range(loans):
+            pair = (book_ids[i % len(book_ids)], member_ids[(i * 7919) % len(member_ids)])
+            active = i % 5 == 0 and pair not in seen
+            if active:
+                seen.add(pair)
+            records.append(IssueRecord(
+                book_id=pair[0], member_id=pair[1],
+                due_date=today - timedelta(days=i % 60 - 30),
+                status='issued' if active else 'returned',
+            ))
+        IssueRecord.objects.bulk_create(records, batch_size=5000)
+
+    def hot_queries(self):
+        book = Book.objects.order_by('?').first()
+        member = Member.objects.order_by('?').first()
+        today = date.today()
+        active = IssueRecord.ACTIVE_STATUSES
+        return {
+            'issues by status': IssueRecord.objects.filter(status='issued').order_by('-issue_date', '-id')[:10],
+            'issues newest first': IssueRecord.objects.order_by('-issue_date', '-id')[:10],
+            'active loan lookup': IssueRecord.objects.filter(
+                book_id=getattr(book, 'id', 0), member_id=getattr(member, 'id', 0), status__in=active
+            )[:1],
+            'member loan history': IssueRecord.objects.filter(
+                member_id=getattr(member, 'id', 0)
+            ).order_by('-issue_date')[:10],
+            'overdue candidates': IssueRecord.objects.filter(
+                status__in=active, due_date__lt=today
+            ).order_by().values('due_date').distinct(),
+            'available books': Book.objects.filter(available_copies__gt=0).order_by('-created_at', '-id')[:10],
+            'active members': Member.objects.filter(is_active=True).order_by('-date_joined', '-id')[:10],
+        }
+
+    def explain(self, queryset, label):
+        # The label makes the SQL text unique per phase; SQLite otherwise
+        # reuses the cached EXPLAIN statement planned before the DROP INDEX.
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql} /* {label} */', params)
+            return ' | '.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+
+    def measure(self, queries, label):
+        results = {}
+        for name, queryset in queries.items():
+            plan = self.explain(queryset, label)
+            timings = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {'ms': statistics.median(timings), 'plan': plan}
+        return results
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (Book, Member, IssueRecord):
+                for index in model._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
@@ -0,0 +1,57 @@
+"""
+Management command to compare DRF serializers with the compiled values() path
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from library.fastpath import FastJSONRenderer, compiled, orjson
+from library.models import Book, IssueRecord
+from library.serializers import BookSerializer, IssueRecordSerializer
+
+
+class Command(BaseCommand):
+    help = 'Measure serialization and rendering throughput (rows/s) for the list endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows per run')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        rows = options['rows']
+        cases = [
+            ('books', Book.objects.all()[:rows], BookSerializer),
+            ('issues', IssueRecord.objects.select_related('book', 'member__user')[:rows], IssueRecordSerializer),
+        ]
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; FastJSONRenderer uses the stdlib encoder'))
+
+        for name, queryset, serializer_class in cases:
+            fast = compiled(serializer_class)
+            count = queryset.count()
+            if not count:
+                raise CommandError(f'No {name} to serialize; seed data first (generate_load_data)')
+
+            drf_data = serializer_class(queryset, many=True).data
+            fast_data = fast.many(fast.values(queryset))
+            drf_bytes = JSONRenderer().render(drf_data)
+            fast_bytes = FastJSONRenderer().render(fast_data)
+            if drf_bytes != fast_bytes:
+                raise CommandError(f'{name}: fast path output differs from the DRF serializer')
+
+            self.stdout.write(f'{name} ({count} rows, {len(drf_bytes):,} bytes, output identical)')
+            self.report('DRF serializer (query + serialize)',
+                        count, lambda: serializer_class(queryset.all(), many=True).data)
+            self.report('compiled values() (query + serialize)',
+                        count, lambda: fast.many(fast.values(queryset.all())))
+            self.report('JSONRenderer', count, lambda: JSONRenderer().render(drf_data))
+            self.report('FastJSONRenderer', count, lambda: FastJSONRenderer().render(fast_data))
+
+    def report(self, label, count, func):
+        best = float('inf')
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        self.stdout.write(f'  {label:<40} {count / best:>12,.0f} rows/s  ({best * 1000:.1f} ms)')
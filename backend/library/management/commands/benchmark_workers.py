@@ -0,0 +1,216 @@
+"""
+Management command to compare sync (WSGI) workers with the ASGI async views.
+
+Sync mode runs the WSGI app behind ``--workers`` slots, one request per slot
+at a time, as gunicorn's sync workers do. ASGI mode runs every connection on
+one event loop, as a single uvicorn worker does. ``--delay`` simulates slow
+clients: a sync worker stays busy until the client has read the response,
+while an async worker only parks a coroutine.
+
+Both modes measure memory the same way: a separate pass opens
+``--connections`` connections with one request each, a background thread
+samples the process's resident set size, and the growth from just before the
+pass to its peak is divided by the number of connections (KiB per connection).
+A sync deployment also needs a worker process per concurrent connection, which
+``workers_for_all_connections`` shows.
+"""
+import asyncio
+import json
+import multiprocessing
+import resource
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from library.loadtest import ASGIClient, WSGIClient, percentile, run_concurrently
+from library.management.commands.benchmark_api import BENCH_USERNAME
+
+
+def resident_kib():
+    """Current resident set size of this process in KiB"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize() / 1024
+    except OSError:
+        # No /proc: the peak so far is the best available (bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 if sys.platform == 'darwin' else peak
+
+
+class PeakResidentMemory:
+    """Samples RSS from a background thread; ``growth_kib`` is the peak over the value on entry"""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.baseline = self.peak = resident_kib()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, resident_kib())
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, resident_kib())
+
+    @property
+    def growth_kib(self):
+        return self.peak - self.baseline
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrency, latency and memory per connection of sync workers and ASGI mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=64, help='Concurrent client connections')
+        parser.add_argument(
+            '--workers', type=int, default=multiprocessing.cpu_count() * 2 + 1,
+            help='Sync worker slots (gunicorn_config.py default: 2 * CPUs + 1)',
+        )
+        parser.add_argument('--requests', type=int, default=400, help='Requests per mode')
+        parser.add_argument('--delay', type=float, default=50, help='Simulated client read time per response (ms)')
+        parser.add_argument('--path', default='/api/issues/', help='Endpoint to request')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        self.connections = options['connections']
+        self.total = options['requests']
+        self.delay = options['delay'] / 1000
+        self.path = options['path']
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'is_staff': True})
+        self.token = str(RefreshToken.for_user(user).access_token)
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['localhost']):
+            self.stdout.write(f"Sync workers ({options['workers']} slots, {self.connections} connections)...")
+            results['sync'] = self.run_sync(options['workers'])
+            self.report(results['sync'])
+
+            asgi_settings = {
+                'ASGI_MODE': True,
+                'ROOT_URLCONF': 'library_project.urls_asgi',
+                'MIDDLEWARE': [name for name in settings.MIDDLEWARE if 'whitenoise' not in name],
+            }
+            with override_settings(**asgi_settings):
+                self.stdout.write(f'ASGI worker (1 event loop, {self.connections} connections)...')
+                results['asgi'] = self.run_asgi()
+                self.report(results['asgi'])
+
+        if options['output']:
+            document = {
+                'meta': {
+                    'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+                    'path': self.path,
+                    'connections': self.connections,
+                    'workers': options['workers'],
+                    'requests': self.total,
+                    'delay_ms': options['delay'],
+                    'database': settings.DATABASES['default']['ENGINE'],
+                },
+                'modes': results,
+            }
+            with open(options['output'], 'w') as handle:
+                json.dump(document, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run_sync(self, workers):
+        application = WSGIHandler()
+        slots = threading.Semaphore(workers)
+        local = threading.local()
+        samples, errors = [], []
+
+        def worker(index):
+            if not hasattr(local, 'client'):
+                local.client = WSGIClient(application)
+                local.client.token = self.token
+            started = time.perf_counter()
+            with slots:
+                status, _ = local.client.request('GET', self.path, read_delay=self.delay)
+            samples.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                errors.append(status)
+
+        wall = run_concurrently(worker, self.connections, self.total)
+        result = self.summary(samples, errors, wall)
+
+        # One request per connection, all open at once
+        with PeakResidentMemory() as memory:
+            run_concurrently(worker, self.connections, self.connections)
+        result.update({
+            # Each sync worker is a process that serves one connection at a time
+            'connections_per_worker': 1,
+            'workers_for_all_connections': self.connections,
+            'rss_per_connection_kib': round(memory.growth_kib / self.connections, 1),
+        })
+        return result
+
+    def run_asgi(self):
+        application = ASGIHandler()
+        client = ASGIClient(application)
+        client.token = self.token
+
+        async def drive(total, samples, errors):
+            counter = iter(range(total))
+
+            async def connection():
+                for _ in counter:
+                    started = time.perf_counter()
+                    status, _ = await client.request('GET', self.path, read_delay=self.delay)
+                    samples.append((time.perf_counter() - started) * 1000)
+                    if status != 200:
+                        errors.append(status)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(connection() for _ in range(self.connections)))
+            return time.perf_counter() - started
+
+        samples, errors = [], []
+        wall = asyncio.run(drive(self.total, samples, errors))
+        result = self.summary(samples, errors, wall)
+        if errors:
+            raise CommandError(f'ASGI mode returned non-200 statuses: {sorted(set(errors))}')
+
+        # One request per connection, all open at once
+        with PeakResidentMemory() as memory:
+            asyncio.run(drive(self.connections, [], []))
+        result.update({
+            'connections_per_worker': self.connections,
+            'workers_for_all_connections': 1,
+            'rss_per_connection_kib': round(memory.growth_kib / self.connections, 1),
+        })
+        return result
+
+    def summary(self, samples, errors, wall):
+        timings = sorted(samples)
+        return {
+            'requests': len(timings),
+            'errors': len(errors),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.fmean(timings), 3) if timings else 0.0,
+            'throughput_rps': round(len(timings) / wall, 1) if wall else 0.0,
+        }
+
+    def report(self, result):
+        self.stdout.write(
+            f"  p50 {result['p50_ms']:.1f}ms  p95 {result['p95_ms']:.1f}ms  p99 {result['p99_ms']:.1f}ms  "
+            f"{result['throughput_rps']:.1f} req/s  {result['errors']} errors  "
+            f"{result['rss_per_connection_kib']:.1f} KiB RSS/connection  "
+            f"{result['workers_for_all_connections']} worker(s) for {self.connections} connections"
+        )
@@ -0,0 +1,41 @@
+"""
+Management command to rebuild the "borrowed together" recommendations from
+the loan history
+"""
+from django.core.management.base import BaseCommand, CommandError
+from library import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the top-K "borrowed together" neighbours of every book from the issue records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K, help='Neighbours kept per book')
+        parser.add_argument(
+            '--min-together', type=int, default=recommendations.MIN_TOGETHER,
+            help='Members who must have borrowed both books for a pair to count',
+        )
+        parser.add_argument(
+            '--block-size', type=int, default=recommendations.BLOCK_SIZE,
+            help='Books per sparse matrix product (bounds memory use)',
+        )
+        parser.add_argument(
+            '--engine', choices=['scipy', 'python'],
+            help='Default: scipy when NumPy and SciPy are installed, else python',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            result = recommendations.build(
+                top_k=options['top_k'],
+                min_together=options['min_together'],
+                block_size=options['block_size'],
+                engine=options['engine'],
+            )
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {result.rows} recommendations for {result.books} borrowed books from {result.pairs} '
+            f'member/book pairs with the {result.engine} engine in {result.seconds:.1f}s'
+        ))
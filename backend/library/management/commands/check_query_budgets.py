@@ -0,0 +1,94 @@
+"""
+Management command to verify the per-endpoint query budgets.
+
+Seeds issue records and reservations inside a transaction that is rolled back afterwards,
+requests each budgeted endpoint at two data sizes and fails if the query
+count grows with the number of rows or exceeds the declared budget.
+"""
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from library.models import Book, Member, IssueRecord, Reservation
+from library.views import IssueRecordViewSet, MemberViewSet, ReservationViewSet
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Check that list endpoints run a fixed number of queries within their budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=25, help='Issue records per seeding round')
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            # Without the user cache every request pays for its auth user, as budgeted
+            with transaction.atomic(), override_settings(
+                ALLOWED_HOSTS=['*'], QUERY_BUDGET_CHECKS=False, JWT_USER_CACHE_TTL=0,
+            ):
+                failures = self.run_checks(options['rows'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError('Query budget check failed:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All endpoints are within their query budgets.'))
+
+    def run_checks(self, rows):
+        user = User.objects.create_user(username='query-budget-check', password=None)
+        member = Member.objects.create(user=user, member_id='QBUDGET')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+        endpoints = [
+            ('/api/issues/', IssueRecordViewSet.query_budget['list']),
+            ('/api/issues/?status=issued', IssueRecordViewSet.query_budget['list']),
+            ('/api/members/', MemberViewSet.query_budget['list']),
+            (f'/api/members/{member.pk}/issues/', MemberViewSet.query_budget['issues']),
+            ('/api/reservations/', ReservationViewSet.query_budget['list']),
+            ('/api/reservations/mine/', ReservationViewSet.query_budget['mine']),
+        ]
+
+        counts = {}
+        for round_number in (1, 2):
+            self.seed(member, rows, round_number)
+            for url, budget in endpoints:
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} returned {response.status_code}')
+                counts.setdefault(url, []).append(len(queries))
+
+        failures = []
+        for url, budget in endpoints:
+            first, second = counts[url]
+            self.stdout.write(f'{url}: {first} -> {second} queries (budget {budget})')
+            if first != second:
+                failures.append(f'{url}: query count grew from {first} to {second} with more rows')
+            if max(first, second) > budget:
+                failures.append(f'{url}: {max(first, second)} queries exceeds budget of {budget}')
+        return failures
+
+    def seed(self, member, rows, round_number):
+        books = Book.objects.bulk_create([
+            Book(
+                title=f'Budget check {round_number}-{i}',
+                author='Query Budget',
+                isbn=f'QB{round_number:02d}{i:09d}'[:13],
+            )
+            for i in range(rows)
+        ])
+        due = date.today() + timedelta(days=14)
+        IssueRecord.objects.bulk_create([
+            IssueRecord(book=book, member=member, due_date=due) for book in books
+        ])
+        Reservation.objects.bulk_create([Reservation(book=book, member=member) for book in books])
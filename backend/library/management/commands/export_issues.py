@@ -0,0 +1,44 @@
+"""
+Management command to export circulation history as CSV or NDJSON
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from library.exports import DATE_FIELDS, EXPORT_FORMATS, IssueExportFilterSerializer, WRITERS, issue_export_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream issue records joined with book and member fields to a file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help="File to write, or '-' for stdout")
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--status', help='Comma-separated statuses, e.g. issued,overdue')
+        parser.add_argument('--date-field', choices=DATE_FIELDS, default='issue_date')
+        parser.add_argument('--start', help='First date to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to include (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        params = IssueExportFilterSerializer(data={
+            key: value for key, value in {
+                'status': options['status'],
+                'date_field': options['date_field'],
+                'start': options['start'],
+                'end': options['end'],
+            }.items() if value
+        })
+        if not params.is_valid():
+            raise CommandError(params.errors)
+        filters = dict(params.validated_data)
+        filters.pop('output')
+
+        to_stdout = options['output'] == '-'
+        handle = sys.stdout if to_stdout else open(options['output'], 'w', encoding='utf-8', newline='')
+        try:
+            for chunk in WRITERS[options['format']](issue_export_rows(**filters)):
+                handle.write(chunk)
+        finally:
+            if not to_stdout:
+                handle.close()
+        if not to_stdout:
+            self.stderr.write(self.style.SUCCESS(f"Exported issue records to {options['output']}"))
@@ -0,0 +1,213 @@
+"""
+Management command to generate a large synthetic dataset for load testing
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from library import analytics, caching, circulation, search, stats, typeahead
+from library.models import Book, Member, IssueRecord, Reservation
+
+WORDS = [
+    'shadow', 'river', 'garden', 'empire', 'silent', 'winter', 'golden', 'secret', 'lost', 'city',
+    'ocean', 'night', 'fire', 'stone', 'glass', 'paper', 'storm', 'light', 'forest', 'kingdom',
+    'memory', 'journey', 'mountain', 'letters', 'island', 'house', 'dream', 'machine', 'song', 'war',
+]
+FIRST_NAMES = [
+    'Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn',
+    'Maria', 'Wei', 'Amir', 'Priya', 'Kofi', 'Yuki', 'Lena', 'Omar', 'Sofia', 'Ivan',
+]
+LAST_NAMES = [
+    'Smith', 'Garcia', 'Chen', 'Khan', 'Okafor', 'Tanaka', 'Novak', 'Silva', 'Müller', 'Rossi',
+    'Kim', 'Patel', 'Nguyen', 'Cohen', 'Dubois', 'Larsen', 'Haddad', 'Kowalski', 'Reyes', 'Brown',
+]
+
+
+@contextmanager
+def historical_timestamps(*fields):
+    """Let bulk_create keep the dates we generate instead of auto_now_add"""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = 'Generate millions of books, members and loans with bulk_create for capacity testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100000)
+        parser.add_argument('--members', type=int, default=10000)
+        parser.add_argument('--loans', type=int, default=200000)
+        parser.add_argument('--days', type=int, default=730, help='Span of loan history in days')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; also namespaces generated keys')
+        parser.add_argument('--password', default='loadtest123', help='Password shared by all generated users')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.seed = options['seed']
+        self.batch_size = options['batch_size']
+        self.today = timezone.now().date()
+        started = time.monotonic()
+
+        book_ids = self.create_books(options['books'], options['days'])
+        member_ids = self.create_members(options['members'], options['days'], options['password'])
+        loans = self.create_loans(book_ids, member_ids, options['loans'], options['days'])
+
+        self.stdout.write('Refreshing available copies, member counters, search index and analytics rollups...')
+        self.refresh_available_copies(book_ids)
+        circulation.repair_member_counters(member_ids)
+        search.rebuild_index()
+        analytics.rebuild()
+        stats.invalidate()
+        caching.bump_generation()
+        typeahead.books.invalidate()
+        typeahead.members.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(book_ids)} books, {len(member_ids)} members and {loans} loans '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
+
+    def progress(self, label, done, total, started):
+        rate = done / max(time.monotonic() - started, 1e-9)
+        self.stdout.write(f'  {label}: {done}/{total} ({rate:,.0f} rows/s)')
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(start + self.batch_size, total)
+
+    def random_moment(self, days):
+        day = self.today - timedelta(days=self.rng.randint(0, days))
+        moment = datetime.combine(day, dt_time(self.rng.randint(8, 19), self.rng.randint(0, 59)))
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+    def create_books(self, total, days):
+        self.stdout.write(f'Creating {total} books...')
+        ids, started = [], time.monotonic()
+        self.copies = {}
+        with historical_timestamps(Book._meta.get_field('created_at')):
+            for start, end in self.batches(total):
+                batch = []
+                for i in range(start, end):
+                    copies = self.rng.choice((1, 1, 2, 3, 5))
+                    batch.append(Book(
+                        title=' '.join(self.rng.sample(WORDS, self.rng.randint(2, 4))).title(),
+                        author=f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}',
+                        isbn=f'9{self.seed % 100:02d}{i:010d}',
+                        publication_date=date(self.rng.randint(1850, self.today.year), 1, 1),
+                        total_copies=copies,
+                        available_copies=copies,
+                        created_at=self.random_moment(days * 2),
+                    ))
+                with transaction.atomic():
+                    for book in Book.objects.bulk_create(batch):
+                        ids.append(book.pk)
+                        self.copies[book.pk] = book.total_copies
+                self.progress('books', end, total, started)
+        return ids
+
+    def create_members(self, total, days, password):
+        self.stdout.write(f'Creating {total} members...')
+        # Hash once and share it: hashing per user would dominate the run
+        password_hash = make_password(password)
+        ids, started = [], time.monotonic()
+        with historical_timestamps(Member._meta.get_field('date_joined')):
+            for start, end in self.batches(total):
+                users = []
+                for i in range(start, end):
+                    first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                    users.append(User(
+                        username=f'load{self.seed}_{i}',
+                        email=f'load{self.seed}_{i}@example.com',
+                        first_name=first,
+                        last_name=last,
+                        password=password_hash,
+                    ))
+                with transaction.atomic():
+                    users = User.objects.bulk_create(users)
+                    members = Member.objects.bulk_create([
+                        Member(
+                            user=user,
+                            member_id=f'L{self.seed % 100:02d}{start + offset:08d}',
+                            is_active=self.rng.random() > 0.05,
+                            date_joined=self.random_moment(days).date(),
+                        )
+                        for offset, user in enumerate(users)
+                    ])
+                ids.extend(member.pk for member in members)
+                self.progress('members', end, total, started)
+        return ids
+
+    def create_loans(self, book_ids, member_ids, total, days):
+        if not (book_ids and member_ids and total):
+            return 0
+        self.stdout.write(f'Creating {total} loans...')
+        copies = self.copies
+        on_loan = {}
+        active_pairs = set()
+        created, started = 0, time.monotonic()
+
+        with historical_timestamps(
+            IssueRecord._meta.get_field('issue_date'), IssueRecord._meta.get_field('created_at')
+        ):
+            for start, end in self.batches(total):
+                batch = []
+                for _ in range(start, end):
+                    # Skew towards the front of the catalog so some titles are popular
+                    book_id = book_ids[int(len(book_ids) * self.rng.random() ** 3)]
+                    member_id = self.rng.choice(member_ids)
+                    issued_at = self.random_moment(days)
+                    issue_date = issued_at.date()
+                    due_date = issue_date + timedelta(days=14)
+                    record = IssueRecord(
+                        book_id=book_id, member_id=member_id, issue_date=issue_date,
+                        due_date=due_date, created_at=issued_at,
+                    )
+                    recent = (self.today - issue_date).days <= 30
+                    pair = (book_id, member_id)
+                    if (recent and self.rng.random() < 0.6 and pair not in active_pairs
+                            and on_loan.get(book_id, 0) < copies[book_id]):
+                        active_pairs.add(pair)
+                        on_loan[book_id] = on_loan.get(book_id, 0) + 1
+                        if due_date < self.today:
+                            record.status = 'overdue'
+                            record.fine_amount = (self.today - due_date).days * IssueRecord.FINE_PER_DAY
+                    else:
+                        returned = issue_date + timedelta(days=self.rng.randint(1, 28))
+                        record.return_date = min(returned, self.today)
+                        record.status = 'returned'
+                        if record.return_date > due_date:
+                            record.fine_amount = (record.return_date - due_date).days * IssueRecord.FINE_PER_DAY
+                    batch.append(record)
+                with transaction.atomic():
+                    IssueRecord.objects.bulk_create(batch)
+                created += len(batch)
+                self.progress('loans', end, total, started)
+        return created
+
+    def refresh_available_copies(self, book_ids):
+        """Shelve the generated books' copies that are neither on loan nor on the hold shelf"""
+        def out(queryset):
+            counted = queryset.filter(book=OuterRef('pk')).order_by().values('book').annotate(n=Count('id')).values('n')
+            return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+        on_loan = out(IssueRecord.objects.filter(status__in=IssueRecord.ACTIVE_STATUSES))
+        on_hold = out(Reservation.objects.filter(status='ready'))
+        for start, end in self.batches(len(book_ids)):
+            Book.objects.filter(id__in=book_ids[start:end]).update(
+                available_copies=F('total_copies') - on_loan - on_hold,
+            )
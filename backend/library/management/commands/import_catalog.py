@@ -0,0 +1,59 @@
+"""
+Management command to bulk import books from CSV, NDJSON or MARC-like text
+"""
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from library.catalog_import import DEFAULT_BATCH_SIZE, FORMATS, CatalogImport, PARSERS, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Stream a catalog file into the book table, upserting on ISBN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file, or '-' for stdin")
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to a guess from the file extension')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--report', help='Write every rejected row to this file as JSON lines')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        try:
+            stream = sys.stdin if options['path'] == '-' else open(
+                options['path'], encoding='utf-8-sig', newline=''
+            )
+        except OSError as exc:
+            raise CommandError(f"Cannot open {options['path']}: {exc}")
+        report = open(options['report'], 'w') if options['report'] else None
+
+        def on_error(entry):
+            if report is not None:
+                report.write(json.dumps(entry) + '\n')
+
+        catalog = CatalogImport(options['batch_size'], on_error)
+        try:
+            self.stdout.write(f'Importing {fmt} from {options["path"]}...')
+            result = catalog.run(self.counted(PARSERS[fmt](stream), catalog))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if report is not None:
+                report.close()
+
+        for entry in result.errors[:10]:
+            self.stdout.write(self.style.WARNING(f"  line {entry['line']}: {entry['errors']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.rows} rows in {result.seconds:.1f}s: {result.created} created, '
+            f'{result.updated} updated, {result.failed} rejected, {result.clamped} clamped'
+        ))
+
+    def counted(self, records, catalog, every=50000):
+        """Pass records through, reporting progress"""
+        for count, record in enumerate(records, 1):
+            yield record
+            if count % every == 0:
+                self.stdout.write(
+                    f'  {count} rows: {catalog.result.created} created, {catalog.result.updated} updated, '
+                    f'{catalog.result.failed} rejected'
+                )
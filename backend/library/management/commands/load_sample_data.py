@@ -3,6 +3,8 @@ Management command to load sample data for demonstration
 """
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from django.db.models import F
+from library import analytics
 from library.models import Book, Member, IssueRecord
 from datetime import date, timedelta
 import random
@@ -192,6 +194,9 @@ class Command(BaseCommand):
                         status='issued'
                     )
                     
+                    analytics.record_issues([issue_record])
+                    Member.objects.filter(id=member.id).update(active_loans=F('active_loans') + 1)
+
                     # Update book available copies
                     book.available_copies -= 1
                     book.save()
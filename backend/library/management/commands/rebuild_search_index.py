@@ -0,0 +1,23 @@
+"""
+Management command to rebuild the catalog full-text search index
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from library import search
+from library.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all books'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING(
+                'Full-text search is not supported on this database; search falls back to icontains.'
+            ))
+            return
+
+        with transaction.atomic():
+            search.rebuild_index()
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Book.objects.count()} books.'))
@@ -0,0 +1,41 @@
+"""
+Management command to compare the members' loan and fine counters with
+their issue records, and optionally recount the ones that drifted
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from library import circulation
+
+MAX_LISTED = 20
+
+
+class Command(BaseCommand):
+    help = "Check members' active_loans and outstanding_fines against their loans"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Recount the members that drifted')
+        parser.add_argument('--batch-size', type=int, default=circulation.REPAIR_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        drift = circulation.member_counter_drift()
+        for pk, member_id, loans, actual_loans, fines, actual_fines in drift[:MAX_LISTED]:
+            self.stdout.write(
+                f'{member_id} (#{pk}): {loans} loans / ${fines:.2f} fines recorded, '
+                f'{actual_loans} / ${actual_fines:.2f} actual'
+            )
+        if len(drift) > MAX_LISTED:
+            self.stdout.write(f'... and {len(drift) - MAX_LISTED} more')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS(
+                f'All member counters match their loans ({time.monotonic() - started:.1f}s)'
+            ))
+        elif options['fix']:
+            repaired = circulation.repair_member_counters([pk for pk, *_ in drift], options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Recounted {repaired} members in {time.monotonic() - started:.1f}s'
+            ))
+        else:
+            raise CommandError(f'{len(drift)} members have drifted counters; run with --fix to recount them')
@@ -0,0 +1,38 @@
+"""
+Management command to mark overdue loans and compute their fines, and to
+expire uncollected reservation holds
+"""
+from django.core.management.base import BaseCommand
+from library.circulation import expire_holds
+from library.sweeper import DEFAULT_CHUNK_SIZE, sweep_every, sweep_overdue
+
+
+class Command(BaseCommand):
+    help = 'Flip overdue loans to "overdue" and compute fine_amount with set-based updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Number of issue record ids covered by each UPDATE',
+        )
+        parser.add_argument(
+            '--every', type=int, default=0, metavar='SECONDS',
+            help='Keep running and sweep every SECONDS instead of once',
+        )
+
+    def handle(self, *args, **options):
+        if options['every'] > 0:
+            self.stdout.write(self.style.SUCCESS(
+                f"Sweeping overdue loans every {options['every']} seconds (Ctrl+C to stop)"
+            ))
+            try:
+                sweep_every(options['every'], chunk_size=options['chunk_size'])
+            except KeyboardInterrupt:
+                pass
+            return
+
+        result = sweep_overdue(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {result.rows} overdue loans in {result.chunks} chunks ({result.seconds:.3f}s)'
+        ))
+        self.stdout.write(self.style.SUCCESS(f'Expired {expire_holds()} uncollected holds'))
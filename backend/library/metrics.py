@@ -0,0 +1,206 @@
+"""
+Per-view request metrics.
+
+``RequestMetricsMiddleware`` samples requests (``REQUEST_METRICS_SAMPLE_RATE``)
+and records wall time, DB time, query and duplicate-query counts and response
+size per view, labelled ``<router basename>.<action>``. Sampled responses get a
+``Server-Timing`` header, and the in-process histograms are exposed in
+Prometheus text format by ``metrics_view`` to staff users and to scrapers
+holding ``REQUEST_METRICS_TOKEN``.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedJWTAuthentication
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class ViewStats:
+    __slots__ = ('buckets', 'count', 'wall_ms', 'db_ms', 'queries', 'duplicates', 'bytes')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.wall_ms = 0.0
+        self.db_ms = 0.0
+        self.queries = 0
+        self.duplicates = 0
+        self.bytes = 0
+
+
+class Registry:
+    """Thread-safe cumulative histograms keyed by view label"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, label, wall_ms, db_ms, queries, duplicates, size):
+        with self.lock:
+            stats = self.views.get(label)
+            if stats is None:
+                stats = self.views[label] = ViewStats()
+            stats.buckets[bisect_left(BUCKETS_MS, wall_ms)] += 1
+            stats.count += 1
+            stats.wall_ms += wall_ms
+            stats.db_ms += db_ms
+            stats.queries += queries
+            stats.duplicates += duplicates
+            stats.bytes += size
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = [
+            '# HELP library_request_duration_seconds Wall time per view.',
+            '# TYPE library_request_duration_seconds histogram',
+        ]
+        with self.lock:
+            snapshot = sorted(self.views.items())
+            for label, stats in snapshot:
+                cumulative = 0
+                for bound, hits in zip(BUCKETS_MS + ('+Inf',), stats.buckets):
+                    cumulative += hits
+                    le = bound if bound == '+Inf' else bound / 1000
+                    lines.append(f'library_request_duration_seconds_bucket{{view="{label}",le="{le}"}} {cumulative}')
+                lines.append(f'library_request_duration_seconds_sum{{view="{label}"}} {stats.wall_ms / 1000:.6f}')
+                lines.append(f'library_request_duration_seconds_count{{view="{label}"}} {stats.count}')
+
+            counters = [
+                ('library_db_duration_seconds_total', 'DB time per view.', lambda s: f'{s.db_ms / 1000:.6f}'),
+                ('library_db_queries_total', 'Queries per view.', lambda s: s.queries),
+                ('library_db_duplicate_queries_total', 'Repeated identical queries per view.', lambda s: s.duplicates),
+                ('library_response_bytes_total', 'Serialized response bytes per view.', lambda s: s.bytes),
+            ]
+            for name, help_text, value in counters:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for label, stats in snapshot:
+                    lines.append(f'{name}{{view="{label}"}} {value(stats)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryTimer:
+    """``connection.execute_wrapper`` hook counting queries, duplicates and DB time"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.seen = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.seen[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(hits - 1 for hits in self.seen.values())
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    func = match.func
+    actions = getattr(func, 'actions', None)
+    initkwargs = getattr(func, 'initkwargs', {})
+    if actions is not None and initkwargs.get('basename'):
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f"{initkwargs['basename']}.{action}"
+    return match.view_name or match._func_path
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_METRICS_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        return self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        return self.finish(request, response, timer, started)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        # Under ASGI the ORM runs on the request's sync thread, so the
+        # wrapper has to be installed on that thread's connection
+        timer = QueryTimer()
+        started = time.perf_counter()
+        await sync_to_async(lambda: connection.execute_wrappers.append(timer))()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(timer))()
+        return self.finish(request, response, timer, started)
+
+    def finish(self, request, response, timer, started):
+        wall_ms = (time.perf_counter() - started) * 1000
+        db_ms = timer.seconds * 1000
+
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(view_label(request), wall_ms, db_ms, timer.count, timer.duplicates, size)
+        response['Server-Timing'] = (
+            f'app;dur={wall_ms:.1f}, db;dur={db_ms:.1f};desc="{timer.count} queries"'
+        )
+        return response
+
+
+def _may_read_metrics(request):
+    token = getattr(settings, 'REQUEST_METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and constant_time_compare(header, f'Bearer {token}'):
+        return True
+    user = getattr(request, 'user', None)
+    if header and not (user and user.is_authenticated):
+        try:
+            user, _ = CachedJWTAuthentication().authenticate(request) or (None, None)
+        except AuthenticationFailed:
+            return False
+    return bool(user and user.is_authenticated and user.is_staff)
+
+
+def metrics_view(request):
+    if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+        raise Http404
+    if not _may_read_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='issuerecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['issued', 'overdue'])), fields=('book', 'member'), name='unique_active_loan'),
+        ),
+    ]
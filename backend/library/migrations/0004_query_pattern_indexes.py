@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_issuerecord_unique_active_loan'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['-created_at', '-id'], name='book_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(condition=models.Q(('available_copies__gt', 0)), fields=['-created_at', '-id'], name='book_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuerecord',
+            index=models.Index(fields=['status', '-issue_date', '-id'], name='issue_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuerecord',
+            index=models.Index(fields=['-issue_date', '-id'], name='issue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuerecord',
+            index=models.Index(fields=['member', '-issue_date'], name='issue_member_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issuerecord',
+            index=models.Index(fields=['status', 'due_date'], name='issue_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-date_joined', '-id'], name='member_active_joined_idx'),
+        ),
+    ]
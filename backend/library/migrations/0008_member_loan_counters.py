@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:25
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def count_active_loans(apps, schema_editor):
+    Member = apps.get_model('library', 'Member')
+    IssueRecord = apps.get_model('library', 'IssueRecord')
+    active = (
+        IssueRecord.objects.filter(member=OuterRef('pk'), status__in=['issued', 'overdue'])
+        .order_by()
+        .values('member')
+    )
+    Member.objects.update(
+        active_loans=Coalesce(Subquery(active.annotate(count=Count('id')).values('count')), 0),
+        outstanding_fines=Coalesce(
+            Subquery(active.annotate(total=Sum('fine_amount')).values('total')),
+            Value(0),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_book_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='active_loans',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='outstanding_fines',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(count_active_loans, migrations.RunPython.noop),
+    ]
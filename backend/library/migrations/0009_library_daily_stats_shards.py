@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_member_loan_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='librarydailystats',
+            name='shard',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='librarydailystats',
+            name='day',
+            field=models.DateField(),
+        ),
+        migrations.AddConstraint(
+            model_name='librarydailystats',
+            constraint=models.UniqueConstraint(fields=('day', 'shard'), name='library_daily_stats_unique'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from library.search import rebuild_index
+
+
+def reindex(apps, schema_editor):
+    # ISBNs are now indexed without spaces as well as hyphens
+    rebuild_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_library_daily_stats_shards'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex, migrations.RunPython.noop),
+    ]
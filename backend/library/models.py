@@ -1,3 +1,4 @@
+from decimal import Decimal
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
@@ -16,6 +17,16 @@ class Book(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Newest-first listing and keyset pagination
+            models.Index(fields=['-created_at', '-id'], name='book_created_idx'),
+            # /books/available/ only ever scans books with copies on the shelf
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(available_copies__gt=0),
+                name='book_available_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author}"
@@ -34,9 +45,20 @@ class Member(models.Model):
     address = models.TextField(blank=True)
     date_joined = models.DateField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    # Denormalized from the member's issued and overdue loans by circulation,
+    # so checkout policy checks don't have to count them
+    active_loans = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    outstanding_fines = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
     class Meta:
         ordering = ['-date_joined']
+        indexes = [
+            models.Index(
+                fields=['-date_joined', '-id'],
+                condition=models.Q(is_active=True),
+                name='member_active_joined_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} ({self.member_id})"
@@ -48,6 +70,8 @@ class IssueRecord(models.Model):
         ('returned', 'Returned'),
         ('overdue', 'Overdue'),
     ]
+    ACTIVE_STATUSES = ('issued', 'overdue')
+    FINE_PER_DAY = Decimal('1.00')
 
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='issue_records')
     member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='issue_records')
@@ -61,17 +85,169 @@ class IssueRecord(models.Model):
 
     class Meta:
         ordering = ['-issue_date']
+        constraints = [
+            # A member can hold at most one active loan of the same book
+            models.UniqueConstraint(
+                fields=['book', 'member'],
+                condition=models.Q(status__in=['issued', 'overdue']),
+                name='unique_active_loan',
+            ),
+        ]
+        indexes = [
+            # ?status= filter ordered newest first
+            models.Index(fields=['status', '-issue_date', '-id'], name='issue_status_date_idx'),
+            # Unfiltered list and keyset pagination
+            models.Index(fields=['-issue_date', '-id'], name='issue_date_idx'),
+            # A member's loan history
+            models.Index(fields=['member', '-issue_date'], name='issue_member_date_idx'),
+            # Overdue sweeps: active statuses past their due date
+            models.Index(fields=['status', 'due_date'], name='issue_status_due_idx'),
+        ]
 
     def __str__(self):
         return f"{self.book.title} - {self.member.user.username} ({self.status})"
 
+    def fine_as_of(self, day):
+        """Fine owed for this loan on the given day ($1 per day overdue)"""
+        if self.status not in self.ACTIVE_STATUSES or day <= self.due_date:
+            return self.fine_amount
+        return (day - self.due_date).days * self.FINE_PER_DAY
+
     def calculate_fine(self):
         """Calculate fine if book is overdue"""
         from django.utils import timezone
-        if self.status == 'issued' and timezone.now().date() > self.due_date:
-            days_overdue = (timezone.now().date() - self.due_date).days
-            # Fine: $1 per day overdue
-            self.fine_amount = days_overdue * 1.00
+        today = timezone.now().date()
+        if self.status == 'issued' and today > self.due_date:
+            added = self.fine_as_of(today) - self.fine_amount
+            self.fine_amount += added
             self.status = 'overdue'
             self.save()
+            Member.objects.filter(id=self.member_id).update(outstanding_fines=models.F('outstanding_fines') + added)
         return self.fine_amount
+
+
+class Reservation(models.Model):
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('ready', 'Ready for pickup'),
+        ('fulfilled', 'Fulfilled'),
+        ('cancelled', 'Cancelled'),
+        ('expired', 'Expired'),
+    ]
+    ACTIVE_STATUSES = ('waiting', 'ready')
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='reservations')
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='reservations')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    # Set when a returned copy is set aside for this member
+    ready_at = models.DateTimeField(null=True, blank=True)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # One place in a book's queue per member
+            models.UniqueConstraint(
+                fields=['book', 'member'],
+                condition=models.Q(status__in=['waiting', 'ready']),
+                name='unique_active_reservation',
+            ),
+        ]
+        indexes = [
+            # Head of a book's queue and queue positions, oldest first
+            models.Index(
+                fields=['book', 'created_at', 'id'],
+                condition=models.Q(status='waiting'),
+                name='reservation_queue_idx',
+            ),
+            # A member's holds
+            models.Index(fields=['member', 'status'], name='reservation_member_idx'),
+            # Uncollected holds past their pickup window
+            models.Index(
+                fields=['hold_expires_at'],
+                condition=models.Q(status='ready'),
+                name='reservation_hold_expiry_idx',
+            ),
+            # Unfiltered list and keyset pagination
+            models.Index(fields=['-created_at', '-id'], name='reservation_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book.title} - {self.member.user.username} ({self.status})"
+
+
+class LibraryDailyStats(models.Model):
+    """Library-wide loans, returns and fines collected per day, kept by ``analytics``"""
+    day = models.DateField()
+    # A day's totals are the sum of its shards, so concurrent writers rarely share a row
+    shard = models.SmallIntegerField(default=0)
+    loans = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+    fines = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'shard'], name='library_daily_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.loans} loans"
+
+
+class BookDailyStats(models.Model):
+    """Loans, returns and fines collected per book per day, kept by ``analytics``"""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    loans = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+    fines = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Day first, so report date ranges read straight off this index
+            models.UniqueConstraint(fields=['day', 'book'], name='book_daily_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} on {self.day}: {self.loans} loans"
+
+
+class MemberMonthlyStats(models.Model):
+    """Loans, returns and fines paid per member per month (``month`` is the 1st), kept by ``analytics``"""
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='monthly_stats')
+    month = models.DateField()
+    loans = models.IntegerField(default=0)
+    returns = models.IntegerField(default=0)
+    fines = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'member'], name='member_monthly_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id} in {self.month:%Y-%m}: {self.loans} loans"
+
+
+class BookRecommendation(models.Model):
+    """One of a book's top "borrowed together" neighbours, rebuilt by ``recommendations.build``"""
+    # The (book, rank) constraint's index covers lookups by book
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommended_with')
+    rank = models.PositiveSmallIntegerField()
+    # Members who borrowed both books
+    together = models.PositiveIntegerField()
+    # Cosine similarity of the two books' borrower sets
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['book', 'rank']
+        constraints = [
+            # A book's neighbours in rank order read straight off this index
+            models.UniqueConstraint(fields=['book', 'rank'], name='book_recommendation_rank_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.recommended_id} (#{self.rank})"
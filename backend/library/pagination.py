@@ -0,0 +1,197 @@
+"""
+Pagination for the library API.
+
+``LibraryPagination`` keeps DRF page-number pagination as the default and
+switches to keyset (cursor) pagination when a request passes ``?cursor=`` or
+``?paginate=cursor``. Keyset pages seek on the view's ``keyset_ordering``
+field with ``id`` as a tiebreak, so every page costs the same however deep
+the client walks, and the total count is only computed when asked for with
+``?count=exact`` or ``?count=estimate``.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    max_page_size = 1000
+    default_ordering = '-id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = self.get_count(queryset, request)
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, fetching through the async ORM"""
+        if request.query_params.get(self.count_query_param) == 'exact':
+            self.count = await queryset.acount()
+        else:
+            self.count = await sync_to_async(self.get_count)(queryset, request)
+        return self.set_page([row async for row in self.page_queryset(queryset, request, view)])
+
+    def page_queryset(self, queryset, request, view):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        ordering = getattr(view, 'keyset_ordering', self.default_ordering)
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        direction = '-' if self.descending else ''
+
+        queryset = queryset.order_by(f'{direction}{self.field}', f'{direction}id')
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(*position))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def seek_filter(self, value, pk):
+        after = 'lt' if self.descending else 'gt'
+        return Q(**{f'{self.field}__{after}': value}) | Q(**{self.field: value, f'id__{after}': pk})
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def encode_cursor(self, obj):
+        # Rows are model instances, or dicts on the values() fast path
+        if isinstance(obj, dict):
+            value, pk = obj[self.field], obj['id']
+        else:
+            value, pk = getattr(obj, self.field), obj.pk
+        payload = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value, pk])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            value = model._meta.get_field(self.field).to_python(value)
+            return value, int(pk)
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+
+def estimate_count(queryset):
+    """Planner row estimate on PostgreSQL; exact count elsewhere"""
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class LibraryPagination(BasePagination):
+    """Page-number pagination by default, keyset pagination on request"""
+    mode_query_param = 'paginate'
+
+    def __init__(self):
+        self.page_number = PageNumberPagination()
+        self.keyset = KeysetPagination(self.page_number.page_size)
+        self.delegate = self.page_number
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.delegate, 'display_page_controls', False)
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.delegate = self.keyset if self.use_keyset(request) else self.page_number
+        return self.delegate.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, fetching through the async ORM"""
+        if self.use_keyset(request):
+            self.delegate = self.keyset
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+
+        self.delegate = pages = self.page_number
+        page_size = pages.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = pages.django_paginator_class(queryset, page_size)
+        # Prime Paginator's cached count so page() does no sync query of its own
+        paginator.count = await queryset.acount()
+        page_number = pages.get_page_number(request, paginator)
+        try:
+            pages.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(pages.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        pages.page.object_list = [row async for row in pages.page.object_list]
+        if paginator.num_pages > 1 and pages.template is not None:
+            pages.display_page_controls = True
+        pages.request = request
+        return list(pages.page)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.page_number.get_paginated_response_schema(schema)
+
+    def to_html(self):
+        return self.delegate.to_html()
+
+    def get_schema_fields(self, view):
+        return self.page_number.get_schema_fields(view)
+
+    def get_schema_operation_parameters(self, view):
+        return self.page_number.get_schema_operation_parameters(view)
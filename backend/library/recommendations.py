@@ -0,0 +1,151 @@
+"""
+"Borrowed together" recommendations.
+
+A batch job reads the loan history as a binary member x book matrix ``A``
+(did this member ever borrow this book) and builds the sparse book x book
+co-occurrence matrix ``C = A.T @ A``: ``C[i, j]`` is the number of members
+who borrowed both books, and ``C[i, i]`` the number who borrowed book ``i``.
+Pairs are scored by cosine similarity, ``C[i, j] / sqrt(C[i, i] * C[j, j])``,
+so the titles everyone borrows don't crowd out everything else. The top
+``TOP_K`` neighbours of every book are written to ``BookRecommendation``,
+and the book detail page reads them with one range scan on ``(book, rank)``.
+
+With NumPy and SciPy installed, ``C`` is computed as sparse matrix products
+a block of books at a time, and ranking happens on whole blocks, so memory
+stays bounded and nothing loops over pairs in Python. Without them the same
+scores and ranking come from a pure-Python inverted index, which is fine
+for small catalogs.
+"""
+import heapq
+import math
+import time
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from . import caching
+from .models import BookRecommendation, IssueRecord
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = sparse = None
+
+TOP_K = 10
+# Pairs borrowed together by fewer members are noise
+MIN_TOGETHER = 2
+BLOCK_SIZE = 128
+WRITE_BATCH_SIZE = 5000
+READ_CHUNK_SIZE = 10000
+
+
+@dataclass
+class BuildResult:
+    engine: str = ''
+    # Distinct member/book pairs in the loan history
+    pairs: int = 0
+    books: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+
+def vectorized():
+    return sparse is not None
+
+
+def loan_pairs():
+    """Distinct ``(member_id, book_id)`` pairs as two parallel int arrays"""
+    members, books = array('q'), array('q')
+    pairs = IssueRecord.objects.order_by().values_list('member_id', 'book_id').distinct()
+    for member_id, book_id in pairs.iterator(chunk_size=READ_CHUNK_SIZE):
+        members.append(member_id)
+        books.append(book_id)
+    return members, books
+
+
+def neighbours_vectorized(members, books, top_k=TOP_K, min_together=MIN_TOGETHER, block_size=BLOCK_SIZE):
+    """Yield ``(book_id, recommended_id, rank, together, score)`` using SciPy sparse products"""
+    book_ids, columns = numpy.unique(numpy.frombuffer(books, dtype=numpy.int64), return_inverse=True)
+    _, rows = numpy.unique(numpy.frombuffer(members, dtype=numpy.int64), return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (numpy.ones(len(rows), dtype=numpy.int32), (rows, columns)),
+        shape=(rows.max() + 1, len(book_ids)),
+    )
+    by_book = matrix.T.tocsr()
+    # Distinct borrowers per book: the diagonal of A.T @ A
+    borrowers = numpy.diff(by_book.indptr).astype(numpy.float64)
+
+    for start in range(0, len(book_ids), block_size):
+        block = (by_book[start:start + block_size] @ matrix).tocoo()
+        sources = block.row + start
+        keep = (block.col != sources) & (block.data >= min_together)
+        sources, targets, together = sources[keep], block.col[keep], block.data[keep]
+        scores = together / numpy.sqrt(borrowers[sources] * borrowers[targets])
+
+        # Best first within each book; ties go to the pair borrowed together
+        # more often, then to the lower book id
+        order = numpy.lexsort((book_ids[targets], -together, -scores, sources))
+        sources, targets, together, scores = sources[order], targets[order], together[order], scores[order]
+        ranks = numpy.arange(len(sources)) - numpy.searchsorted(sources, sources)
+        top = ranks < top_k
+        yield from zip(
+            book_ids[sources[top]].tolist(), book_ids[targets[top]].tolist(),
+            (ranks[top] + 1).tolist(), together[top].tolist(), scores[top].tolist(),
+        )
+
+
+def neighbours_python(members, books, top_k=TOP_K, min_together=MIN_TOGETHER):
+    """Same rows as ``neighbours_vectorized``, from an inverted index in pure Python"""
+    loans = defaultdict(list)
+    borrowed_by = defaultdict(list)
+    for member_id, book_id in zip(members, books):
+        loans[member_id].append(book_id)
+        borrowed_by[book_id].append(member_id)
+
+    for book_id in sorted(borrowed_by):
+        together = Counter()
+        for member_id in borrowed_by[book_id]:
+            together.update(loans[member_id])
+        del together[book_id]
+        readers = len(borrowed_by[book_id])
+        candidates = [
+            (count / math.sqrt(float(readers) * float(len(borrowed_by[other]))), count, other)
+            for other, count in together.items()
+            if count >= min_together
+        ]
+        best = heapq.nsmallest(top_k, candidates, key=lambda candidate: (-candidate[0], -candidate[1], candidate[2]))
+        for rank, (score, count, other) in enumerate(best, 1):
+            yield book_id, other, rank, count, score
+
+
+def build(top_k=TOP_K, min_together=MIN_TOGETHER, block_size=BLOCK_SIZE, engine=None):
+    """Recompute every book's neighbours and replace the table; returns a BuildResult"""
+    started = time.monotonic()
+    engine = engine or ('scipy' if vectorized() else 'python')
+    if engine == 'scipy' and not vectorized():
+        raise RuntimeError('NumPy and SciPy are not installed.')
+
+    members, books = loan_pairs()
+    result = BuildResult(engine=engine, pairs=len(members), books=len(set(books)))
+    if engine == 'scipy' and members:
+        neighbours = neighbours_vectorized(members, books, top_k, min_together, block_size)
+    else:
+        neighbours = neighbours_python(members, books, top_k, min_together)
+    # At most top_k rows per book; computed before the write transaction opens
+    rows = [
+        BookRecommendation(book_id=book_id, recommended_id=recommended_id, rank=rank, together=together, score=score)
+        for book_id, recommended_id, rank, together, score in neighbours
+    ]
+
+    # Readers keep seeing the previous recommendations until this commits
+    with transaction.atomic():
+        BookRecommendation.objects.all().delete()
+        BookRecommendation.objects.bulk_create(rows, batch_size=WRITE_BATCH_SIZE)
+        caching.bump_generation()
+    result.rows = len(rows)
+
+    result.seconds = time.monotonic() - started
+    return result
@@ -0,0 +1,200 @@
+"""
+Full-text catalog search backed by an inverted token index.
+
+SQLite uses an FTS5 virtual table, PostgreSQL uses a tsvector side table with
+a GIN index. Any other database falls back to the old icontains scan.
+
+ISBNs are indexed without spaces or hyphens (``normalize_isbn``, mirrored in
+SQL by ``normalized_isbn_sql`` for full rebuilds), so a search for an ISBN
+finds it however it was typed or stored.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+FTS_TABLE = 'library_book_fts'
+PG_TABLE = 'library_book_search'
+INDEXED_FIELDS = {'title', 'author', 'isbn'}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+ISBN_RE = re.compile(r'^(?:\d{9}[\dX]|\d{13})$')
+ISBN_SEPARATORS = (' ', '-')
+
+
+def normalize_isbn(value):
+    """Strip spaces and hyphens from an ISBN-like string"""
+    value = value or ''
+    for separator in ISBN_SEPARATORS:
+        value = value.replace(separator, '')
+    return value.upper()
+
+
+def normalized_isbn_sql(column='isbn'):
+    """``normalize_isbn`` of ``column`` as an SQL expression"""
+    sql = column
+    for separator in ISBN_SEPARATORS:
+        sql = f"replace({sql}, '{separator}', '')"
+    return f'upper({sql})'
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def _result_limit():
+    return getattr(settings, 'SEARCH_RESULT_LIMIT', 500)
+
+
+def _match_expression(tokens):
+    """Build a prefix query so partially typed words still match"""
+    if connection.vendor == 'postgresql':
+        return ' & '.join(f"{token}:*" for token in tokens)
+    return ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+def ranked_book_ids(search, limit=None):
+    """Return book ids matching ``search``, best match first"""
+    tokens = tokenize(search)
+    if not tokens:
+        return []
+    limit = limit or _result_limit()
+    match = _match_expression(tokens)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"SELECT book_id FROM {PG_TABLE}, to_tsquery('simple', %s) query "
+                f"WHERE document @@ query "
+                f"ORDER BY ts_rank(document, query) DESC, book_id DESC LIMIT %s",
+                [match, limit],
+            )
+        else:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 10.0), rowid DESC LIMIT %s",
+                [match, limit],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def isbn_book_ids(isbn):
+    """Ids of books whose normalized ISBN is ``isbn``, looked up in the index"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Titles share the ISBN's weight, so callers recheck the ISBN itself
+            cursor.execute(
+                f"SELECT book_id FROM {PG_TABLE} WHERE document @@ to_tsquery('simple', %s)",
+                [f'{isbn.lower()}:A'],
+            )
+        else:
+            cursor.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [f'isbn : "{isbn}"'])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _exact_isbn(queryset, isbn):
+    """The books in ``queryset`` whose normalized ISBN is ``isbn``, or None if there are none"""
+    if not is_supported():
+        exact = queryset.filter(isbn=isbn)
+        return exact if exact.exists() else None
+    ids = isbn_book_ids(isbn)
+    if ids:
+        candidates = queryset.filter(id__in=ids).values_list('id', 'isbn')
+        ids = [pk for pk, stored in candidates if normalize_isbn(stored) == isbn]
+    return queryset.filter(id__in=ids) if ids else None
+
+
+def search_books(queryset, search):
+    """Filter and rank a Book queryset by a free-text search term"""
+    isbn = normalize_isbn(search)
+    if ISBN_RE.match(isbn):
+        exact = _exact_isbn(queryset, isbn)
+        if exact is not None:
+            return exact
+
+    if not is_supported():
+        return queryset.filter(
+            Q(title__icontains=search) |
+            Q(author__icontains=search) |
+            Q(isbn__icontains=search)
+        )
+
+    ids = ranked_book_ids(search)
+    if not ids:
+        return queryset.none()
+    rank = Case(
+        *[When(id=book_id, then=Value(position)) for position, book_id in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ids).annotate(search_rank=rank).order_by('search_rank')
+
+
+def _document(book):
+    return {
+        'title': book.title,
+        'author': book.author,
+        'isbn': normalize_isbn(book.isbn),
+    }
+
+
+def index_book(book):
+    """Insert or refresh the index entry for a single book"""
+    if not is_supported():
+        return
+    doc = _document(book)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"INSERT INTO {PG_TABLE} (book_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('simple', %s), 'A') || "
+                f"setweight(to_tsvector('simple', %s), 'B') || "
+                f"setweight(to_tsvector('simple', %s), 'A')) "
+                f"ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document",
+                [book.pk, doc['title'], doc['author'], doc['isbn']],
+            )
+        else:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [book.pk])
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, author, isbn) VALUES (%s, %s, %s, %s)",
+                [book.pk, doc['title'], doc['author'], doc['isbn']],
+            )
+
+
+def remove_book(book_id):
+    """Drop the index entry for a deleted book"""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DELETE FROM {PG_TABLE} WHERE book_id = %s", [book_id])
+        else:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [book_id])
+
+
+def rebuild_index(schema_editor=None):
+    """Repopulate the whole index from the library_book table"""
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor not in ('sqlite', 'postgresql'):
+        return
+    with conn.cursor() as cursor:
+        if conn.vendor == 'postgresql':
+            cursor.execute(f"TRUNCATE {PG_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {PG_TABLE} (book_id, document) "
+                f"SELECT id, "
+                f"setweight(to_tsvector('simple', title), 'A') || "
+                f"setweight(to_tsvector('simple', author), 'B') || "
+                f"setweight(to_tsvector('simple', {normalized_isbn_sql()}), 'A') "
+                f"FROM library_book"
+            )
+        else:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, title, author, isbn) "
+                f"SELECT id, title, author, {normalized_isbn_sql()} FROM library_book"
+            )
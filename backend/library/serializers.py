@@ -1,9 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from django.utils import timezone
-from .models import Book, Member, IssueRecord
-from datetime import timedelta
+from .models import Book, Member, IssueRecord, Reservation
+from . import circulation
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -48,13 +47,22 @@ class BookSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 
+class RelatedBookSerializer(BookSerializer):
+    """A recommended book and how many members borrowed it with the one being viewed"""
+    borrowed_together = serializers.IntegerField(source='together', read_only=True)
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + ['borrowed_together']
+
+
 class MemberSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
         model = Member
-        fields = ['id', 'user', 'member_id', 'phone', 'address', 'date_joined', 'is_active']
-        read_only_fields = ['date_joined']
+        fields = ['id', 'user', 'member_id', 'phone', 'address', 'date_joined', 'is_active',
+                  'active_loans', 'outstanding_fines']
+        read_only_fields = ['date_joined', 'active_loans', 'outstanding_fines']
 
 
 class IssueRecordSerializer(serializers.ModelSerializer):
@@ -70,82 +78,67 @@ class IssueRecordSerializer(serializers.ModelSerializer):
         read_only_fields = ['issue_date', 'return_date', 'status', 'fine_amount', 'created_at', 'updated_at']
 
 
+class ReservationSerializer(serializers.ModelSerializer):
+    book = BookSerializer(read_only=True)
+    member = MemberSerializer(read_only=True)
+    # Annotated by circulation.with_queue_position(); None once the hold is ready
+    queue_position = serializers.IntegerField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Reservation
+        fields = ['id', 'book', 'member', 'status', 'queue_position', 'ready_at', 'hold_expires_at',
+                  'created_at', 'updated_at']
+        read_only_fields = fields
+
+
 class IssueBookSerializer(serializers.Serializer):
     book_id = serializers.IntegerField()
     member_id = serializers.IntegerField()
     due_date = serializers.DateField(required=False)
 
-    def validate_book_id(self, value):
-        try:
-            book = Book.objects.get(id=value)
-            if book.available_copies <= 0:
-                raise serializers.ValidationError("No copies available for this book.")
-            return value
-        except Book.DoesNotExist:
-            raise serializers.ValidationError("Book not found.")
-
-    def validate_member_id(self, value):
-        try:
-            member = Member.objects.get(id=value, is_active=True)
-            return value
-        except Member.DoesNotExist:
-            raise serializers.ValidationError("Member not found or inactive.")
-
     def create(self, validated_data):
-        book = Book.objects.get(id=validated_data['book_id'])
-        member = Member.objects.get(id=validated_data['member_id'])
-        
-        # Check if member already has this book issued
-        existing_issue = IssueRecord.objects.filter(
-            book=book, member=member, status='issued'
-        ).first()
-        
-        if existing_issue:
-            raise serializers.ValidationError("Member already has this book issued.")
-
-        # Calculate due date (default: 14 days from now)
-        due_date = validated_data.get('due_date')
-        if not due_date:
-            due_date = timezone.now().date() + timedelta(days=14)
-
-        issue_record = IssueRecord.objects.create(
-            book=book,
-            member=member,
-            due_date=due_date
+        # Existence, availability and duplicate checks happen inside the
+        # checkout transaction so they cannot race with other checkouts.
+        return circulation.issue_book(
+            validated_data['book_id'],
+            validated_data['member_id'],
+            validated_data.get('due_date'),
         )
 
-        # Update book available copies
-        book.available_copies -= 1
-        book.save()
-
-        return issue_record
-
 
 class ReturnBookSerializer(serializers.Serializer):
     issue_record_id = serializers.IntegerField()
 
-    def validate_issue_record_id(self, value):
-        try:
-            issue_record = IssueRecord.objects.get(id=value, status__in=['issued', 'overdue'])
-            return value
-        except IssueRecord.DoesNotExist:
-            raise serializers.ValidationError("Issue record not found or already returned.")
+    def create(self, validated_data):
+        return circulation.return_book(validated_data['issue_record_id'])
+
+
+class BulkIssueSerializer(serializers.Serializer):
+    items = IssueBookSerializer(many=True, allow_empty=False, max_length=200)
+
+    def create(self, validated_data):
+        return circulation.issue_books(validated_data['items'])
+
+
+class BulkReturnSerializer(serializers.Serializer):
+    issue_record_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=200
+    )
+
+    def create(self, validated_data):
+        return circulation.return_books(validated_data['issue_record_ids'])
+
+
+class ReserveBookSerializer(serializers.Serializer):
+    book_id = serializers.IntegerField()
+    member_id = serializers.IntegerField()
+
+    def create(self, validated_data):
+        return circulation.reserve_book(validated_data['book_id'], validated_data['member_id'])
+
+
+class CancelReservationSerializer(serializers.Serializer):
+    reservation_id = serializers.IntegerField()
 
     def create(self, validated_data):
-        issue_record = IssueRecord.objects.get(id=validated_data['issue_record_id'])
-        
-        # Calculate fine if overdue
-        issue_record.calculate_fine()
-        
-        # Update issue record
-        from django.utils import timezone
-        issue_record.return_date = timezone.now().date()
-        issue_record.status = 'returned'
-        issue_record.save()
-
-        # Update book available copies
-        book = issue_record.book
-        book.available_copies += 1
-        book.save()
-
-        return issue_record
+        return circulation.cancel_reservation(validated_data['reservation_id'])
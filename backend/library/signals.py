@@ -0,0 +1,113 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import authentication, availability, caching, search, stats, typeahead
+from .models import Book, Member, IssueRecord
+
+
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, update_fields=None, **kwargs):
+    """Keep the catalog search index in step with the book table"""
+    if update_fields is not None and not set(update_fields) & search.INDEXED_FIELDS:
+        return
+    search.index_book(instance)
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book_on_delete(sender, instance, **kwargs):
+    search.remove_book(instance.pk)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def invalidate_stats(sender, **kwargs):
+    """Catalog and membership edits show at once; loan counts refresh with the TTL"""
+    stats.invalidate()
+
+
+@receiver(post_delete, sender=IssueRecord)
+def release_deleted_loan(sender, instance, **kwargs):
+    """A loan deleted while still out no longer counts against its member"""
+    if instance.status in IssueRecord.ACTIVE_STATUSES:
+        Member.objects.filter(id=instance.member_id).update(
+            active_loans=Greatest(F('active_loans') - 1, 0),
+            outstanding_fines=Greatest(
+                F('outstanding_fines') - instance.fine_amount, 0,
+                output_field=Member._meta.get_field('outstanding_fines'),
+            ),
+        )
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=IssueRecord)
+@receiver(post_delete, sender=IssueRecord)
+def invalidate_book_responses(sender, **kwargs):
+    caching.bump_generation()
+
+
+@receiver(post_save, sender=Book)
+def publish_book_availability(sender, instance, update_fields=None, **kwargs):
+    """Staff edits to copy counts reach the availability stream too"""
+    if update_fields is not None and 'available_copies' not in update_fields:
+        return
+    availability.changed({instance.pk: instance.available_copies})
+
+
+@receiver(post_save, sender=Book)
+def update_book_typeahead(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & search.INDEXED_FIELDS:
+        return
+    typeahead.books.changed(*typeahead.book_row(instance.pk, instance.title, instance.author, instance.isbn))
+
+
+@receiver(post_delete, sender=Book)
+def remove_book_typeahead(sender, instance, **kwargs):
+    typeahead.books.changed(instance.pk)
+
+
+@receiver(post_save, sender=Member)
+def update_member_typeahead(sender, instance, **kwargs):
+    if instance.is_active:
+        user = instance.user
+        typeahead.members.changed(*typeahead.member_row(
+            instance.pk, instance.member_id, user.first_name, user.last_name, user.username
+        ))
+    else:
+        typeahead.members.changed(instance.pk)
+
+
+@receiver(post_delete, sender=Member)
+def remove_member_typeahead(sender, instance, **kwargs):
+    typeahead.members.changed(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def update_member_typeahead_for_user(sender, instance, created=False, update_fields=None, **kwargs):
+    """Members are matched on their user's names, e.g. after a profile edit"""
+    if created or (update_fields is not None and not set(update_fields) & {'username', 'first_name', 'last_name'}):
+        return
+    member = Member.objects.filter(user=instance, is_active=True).first()
+    if member is not None:
+        typeahead.members.changed(*typeahead.member_row(
+            member.pk, member.member_id, instance.first_name, instance.last_name, instance.username
+        ))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, created=False, **kwargs):
+    if not created:
+        authentication.user_changed(instance.pk)
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def invalidate_cached_member_user(sender, instance, **kwargs):
+    """Cached users carry their member profile"""
+    authentication.user_changed(instance.user_id)
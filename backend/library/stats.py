@@ -0,0 +1,46 @@
+"""
+Cached catalog and circulation totals for the dashboard.
+
+Totals come from aggregate queries and are cached for ``STATS_CACHE_TTL``
+seconds. Checkouts, returns and hold changes don't invalidate them, so on a
+busy desk the aggregates run at most once per TTL and the loan counts may lag
+by that much. Catalog and membership changes, the overdue sweep and bulk
+loads still call ``invalidate()``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Book, Member, IssueRecord
+
+CACHE_KEY = 'library:stats'
+
+
+def compute_stats():
+    books = Book.objects.aggregate(
+        total_books=Count('id'),
+        available_books=Count('id', filter=Q(available_copies__gt=0)),
+    )
+    loans = IssueRecord.objects.aggregate(
+        issued_books=Count('id', filter=Q(status__in=IssueRecord.ACTIVE_STATUSES)),
+        overdue_books=Count('id', filter=Q(status='overdue')),
+    )
+    return {
+        **books,
+        'total_members': Member.objects.filter(is_active=True).count(),
+        **loans,
+    }
+
+
+def get_stats():
+    stats = cache.get(CACHE_KEY)
+    if stats is None:
+        stats = compute_stats()
+        cache.set(CACHE_KEY, stats, getattr(settings, 'STATS_CACHE_TTL', 30))
+    return stats
+
+
+def invalidate():
+    """Drop the cached totals once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
@@ -0,0 +1,124 @@
+"""
+Overdue sweeper.
+
+Flips active loans past their due date to ``overdue`` and refreshes their
+``fine_amount`` with set-based UPDATEs. Every loan due on the same day owes
+the same fine, so the fine is a CASE over overdue due dates instead of
+per-row date arithmetic, which keeps the query portable across SQLite and
+PostgreSQL. Due dates are taken ``MAX_CASE_DATES`` at a time, so the CASE's
+bound parameters stay few however long the loan history is, and each group
+is updated one id range at a time. Loans already marked overdue with the
+current fine are left alone, so a second run on the same day writes
+nothing. The change in each member's fines is added to their
+``outstanding_fines`` counter in the same transaction.
+
+``sweep_every()`` is the loop behind ``manage.py sweep_overdue --every``. It
+runs in the command's own process, in the foreground, and also expires
+reservation holds that were not collected in time (``circulation.expire_holds``).
+"""
+import logging
+import time
+from dataclasses import dataclass
+
+from django.db import close_old_connections, transaction
+from django.db.models import Case, DecimalField, F, Max, Min, Q, Sum, Value, When
+from django.utils import timezone
+
+from . import circulation, stats
+from .models import IssueRecord, Member
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 10000
+# WHENs per CASE, for both due dates and members (two parameters each)
+MAX_CASE_DATES = 100
+
+
+@dataclass
+class SweepResult:
+    rows: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+
+def _batches(items, size=MAX_CASE_DATES):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _add_fines(added):
+    """Add each member's change in fines (member id -> amount) to their counter"""
+    members = list(added.items())
+    for batch in _batches(members):
+        Member.objects.filter(id__in=[member_id for member_id, _ in batch]).update(
+            outstanding_fines=F('outstanding_fines') + circulation._per_id_delta(
+                dict(batch), circulation._money_field()
+            ),
+        )
+
+
+def sweep_overdue(today=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Mark overdue loans and recompute their fines; returns a SweepResult"""
+    started = time.monotonic()
+    today = today or timezone.now().date()
+    result = SweepResult()
+
+    candidates = IssueRecord.objects.filter(
+        status__in=IssueRecord.ACTIVE_STATUSES, due_date__lt=today
+    )
+    due_dates = sorted(candidates.order_by().values_list('due_date', flat=True).distinct())
+    now = timezone.now()
+
+    for group in _batches(due_dates):
+        fine = Case(
+            *[
+                When(due_date=due, then=Value((today - due).days * IssueRecord.FINE_PER_DAY))
+                for due in group
+            ],
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+        # The group is consecutive due dates, so a range selects exactly its loans
+        stale = candidates.filter(due_date__gte=group[0], due_date__lte=group[-1]).exclude(
+            Q(status='overdue') & Q(fine_amount=fine)
+        )
+
+        bounds = stale.order_by().aggregate(low=Min('id'), high=Max('id'))
+        low, high = bounds['low'], bounds['high']
+        while low is not None and low <= high:
+            with transaction.atomic():
+                chunk = stale.filter(id__gte=low, id__lt=low + chunk_size)
+                # Lock the chunk first, so the fines it adds are the fines it writes
+                list(chunk.select_for_update().order_by('id').values_list('id', flat=True))
+                added = {
+                    member_id: amount
+                    for member_id, amount in chunk.order_by().values('member_id')
+                    .annotate(amount=Sum(fine - F('fine_amount'))).values_list('member_id', 'amount')
+                    if amount
+                }
+                result.rows += chunk.update(status='overdue', fine_amount=fine, updated_at=now)
+                _add_fines(added)
+            result.chunks += 1
+            low += chunk_size
+
+    if result.rows:
+        stats.invalidate()
+
+    result.seconds = time.monotonic() - started
+    return result
+
+
+def sweep_every(interval, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run the sweeper and hold expiry every ``interval`` seconds until interrupted"""
+    while True:
+        close_old_connections()
+        try:
+            result = sweep_overdue(chunk_size=chunk_size)
+            logger.info('Overdue sweep updated %d rows in %.3fs', result.rows, result.seconds)
+            expired = circulation.expire_holds()
+            if expired:
+                logger.info('Expired %d uncollected holds', expired)
+        except Exception:
+            logger.exception('Overdue sweep failed')
+        finally:
+            close_old_connections()
+        time.sleep(interval)
@@ -0,0 +1,449 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import analytics, caching, circulation
+from .models import Book, BookRecommendation, IssueRecord, Member, Reservation
+from .views import IssueRecordViewSet, MemberViewSet, ReportViewSet, ReservationViewSet
+
+
+# Every request pays for its auth user, as the budgets assume
+@override_settings(JWT_USER_CACHE_TTL=0, QUERY_BUDGET_CHECKS=False)
+class QueryCountTests(APITestCase):
+    """
+    Each endpoint is requested at two data sizes, with a page large enough
+    to hold every row, and must run the same number of queries both times
+    and stay within its ``query_budget``.
+    """
+    SMALL, LARGE = 3, 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='query-count', password=None, is_staff=True)
+        cls.member = Member.objects.create(user=cls.user, member_id='QCOUNT')
+        cls.book = Book.objects.create(title='Anchor', author='Query Count', isbn='QC00000000000')
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.seeded = 0
+
+    def seed(self, rows):
+        """Grow every table the endpoints read to ``rows`` loans, reservations and recommendations"""
+        start, self.seeded = self.seeded, rows
+        books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', author=f'Author {i}', isbn=f'QC{i:011d}', total_copies=1, available_copies=0)
+            for i in range(start + 1, rows + 1)
+        ])
+        members = [
+            Member.objects.create(
+                user=User.objects.create_user(username=f'reader-{i}', first_name='Reader', last_name=str(i)),
+                member_id=f'QR{i:05d}',
+            )
+            for i in range(start + 1, rows + 1)
+        ]
+        due = date.today() + timedelta(days=14)
+        IssueRecord.objects.bulk_create(
+            [IssueRecord(book=book, member=self.member, due_date=due) for book in books]
+            + [IssueRecord(book=self.book, member=member, due_date=due) for member in members]
+        )
+        Reservation.objects.bulk_create([Reservation(book=book, member=self.member) for book in books])
+        BookRecommendation.objects.bulk_create([
+            BookRecommendation(book=self.book, recommended=book, rank=start + rank, together=2, score=0.5)
+            for rank, book in enumerate(books, 1)
+        ])
+        analytics.rebuild()
+
+    def count_queries(self, url):
+        # Measure the uncached path of the cached endpoints
+        caching.get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def assertConstantQueries(self, url, budget=None):
+        self.seed(self.SMALL)
+        small = self.count_queries(url)
+        self.seed(self.LARGE)
+        large = self.count_queries(url)
+        self.assertEqual(small, large, f'{url}: {small} queries with {self.SMALL} rows, {large} with {self.LARGE}')
+        if budget is not None:
+            self.assertLessEqual(large, budget, f'{url} exceeds its budget of {budget}')
+
+    def test_book_list(self):
+        self.assertConstantQueries('/api/books/?page_size=1000')
+
+    def test_book_detail(self):
+        self.assertConstantQueries(f'/api/books/{self.book.pk}/')
+
+    def test_book_related(self):
+        self.assertConstantQueries(f'/api/books/{self.book.pk}/related/')
+
+    def test_member_list(self):
+        self.assertConstantQueries('/api/members/?page_size=1000', MemberViewSet.query_budget['list'])
+
+    def test_member_detail(self):
+        self.assertConstantQueries(f'/api/members/{self.member.pk}/', MemberViewSet.query_budget['retrieve'])
+
+    def test_member_issues(self):
+        self.assertConstantQueries(
+            f'/api/members/{self.member.pk}/issues/?page_size=1000', MemberViewSet.query_budget['issues']
+        )
+
+    def test_issue_list(self):
+        self.assertConstantQueries('/api/issues/?page_size=1000', IssueRecordViewSet.query_budget['list'])
+
+    def test_issue_list_filtered(self):
+        self.assertConstantQueries(
+            '/api/issues/?status=issued&page_size=1000', IssueRecordViewSet.query_budget['list']
+        )
+
+    def test_issue_detail(self):
+        record = IssueRecord.objects.create(book=self.book, member=self.member, due_date=date.today())
+        self.assertConstantQueries(f'/api/issues/{record.pk}/', IssueRecordViewSet.query_budget['retrieve'])
+
+    def test_reservation_list(self):
+        self.assertConstantQueries('/api/reservations/?page_size=1000', ReservationViewSet.query_budget['list'])
+
+    def test_reservation_detail(self):
+        reservation = Reservation.objects.create(book=self.book, member=self.member)
+        self.assertConstantQueries(
+            f'/api/reservations/{reservation.pk}/', ReservationViewSet.query_budget['retrieve']
+        )
+
+    def test_my_reservations(self):
+        self.assertConstantQueries(
+            '/api/reservations/mine/?page_size=1000', ReservationViewSet.query_budget['mine']
+        )
+
+    def test_popular_report(self):
+        self.assertConstantQueries('/api/reports/popular/?limit=100', ReportViewSet.query_budget['popular'])
+
+    def test_members_report(self):
+        self.assertConstantQueries('/api/reports/members/?limit=100', ReportViewSet.query_budget['members'])
+
+    def test_loans_report(self):
+        self.assertConstantQueries('/api/reports/loans/', ReportViewSet.query_budget['loans'])
+
+    def test_fines_report(self):
+        self.assertConstantQueries('/api/reports/fines/?interval=month', ReportViewSet.query_budget['fines'])
+
+
+@override_settings(JWT_USER_CACHE_TTL=0, QUERY_BUDGET_CHECKS=False)
+class CirculationTestCase(APITestCase):
+    """Staff client plus helpers for the books and members a circulation test needs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='desk', password=None, is_staff=True)
+
+    def setUp(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.staff).access_token}')
+
+    def make_book(self, copies=1, available=None):
+        count = Book.objects.count() + 1
+        return Book.objects.create(
+            title=f'Book {count}', author='Circulation', isbn=f'CT{count:011d}',
+            total_copies=copies, available_copies=copies if available is None else available,
+        )
+
+    def make_member(self, **counters):
+        count = Member.objects.count() + 1
+        user = User.objects.create_user(username=f'member-{count}')
+        return Member.objects.create(user=user, member_id=f'CT{count:05d}', **counters)
+
+    def issue(self, book, member):
+        return self.client.post('/api/issues/issue/', {'book_id': book.pk, 'member_id': member.pk}, format='json')
+
+    def return_loan(self, record_id):
+        return self.client.post('/api/issues/return_book/', {'issue_record_id': record_id}, format='json')
+
+
+class CheckoutTests(CirculationTestCase):
+    def test_issue_takes_a_copy(self):
+        book, member = self.make_book(copies=2), self.make_member()
+        response = self.issue(book, member)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 'issued')
+        book.refresh_from_db()
+        member.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+        self.assertEqual(member.active_loans, 1)
+
+    def test_issue_refused_at_zero_copies(self):
+        book, member = self.make_book(copies=1, available=0), self.make_member()
+        response = self.issue(book, member)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['book_id'], ['No copies available for this book.'])
+        book.refresh_from_db()
+        member.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(member.active_loans, 0)
+        self.assertFalse(IssueRecord.objects.filter(book=book).exists())
+
+    def test_last_copy_goes_to_one_member(self):
+        book = self.make_book(copies=1)
+        first, second = self.make_member(), self.make_member()
+        self.assertEqual(self.issue(book, first).status_code, 201)
+        self.assertEqual(self.issue(book, second).status_code, 400)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+
+    def test_duplicate_active_loan_refused(self):
+        book, member = self.make_book(copies=2), self.make_member()
+        self.assertEqual(self.issue(book, member).status_code, 201)
+        response = self.issue(book, member)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['non_field_errors'], ['Member already has this book issued.'])
+        book.refresh_from_db()
+        member.refresh_from_db()
+        # The refused checkout's decrements were rolled back
+        self.assertEqual(book.available_copies, 1)
+        self.assertEqual(member.active_loans, 1)
+
+    def test_return_puts_the_copy_back(self):
+        book, member = self.make_book(copies=1), self.make_member()
+        record_id = self.issue(book, member).data['id']
+        response = self.return_loan(record_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'returned')
+        book.refresh_from_db()
+        member.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+        self.assertEqual(member.active_loans, 0)
+
+        response = self.return_loan(record_id)
+        self.assertEqual(response.status_code, 400)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+
+    def test_bulk_issue_reports_each_item(self):
+        book, empty, member = self.make_book(copies=1), self.make_book(copies=1, available=0), self.make_member()
+        response = self.client.post('/api/issues/bulk_issue/', {'items': [
+            {'book_id': book.pk, 'member_id': member.pk},
+            {'book_id': empty.pk, 'member_id': member.pk},
+            {'book_id': book.pk, 'member_id': member.pk},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['succeeded'], 1)
+        self.assertEqual([item['ok'] for item in response.data['results']], [True, False, False])
+        book.refresh_from_db()
+        member.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(member.active_loans, 1)
+
+
+class ReservationQueueTests(CirculationTestCase):
+    def reserve(self, book, member):
+        response = self.client.post(
+            '/api/reservations/reserve/', {'book_id': book.pk, 'member_id': member.pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Reservation.objects.get(pk=response.data['id'])
+
+    def lend_last_copy(self):
+        """A one-copy book on loan, and the id of that loan"""
+        book = self.make_book(copies=1)
+        record_id = self.issue(book, self.make_member()).data['id']
+        return book, record_id
+
+    def assertStatus(self, reservation, expected):
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, expected)
+
+    def test_reserve_refused_while_copies_are_on_the_shelf(self):
+        book = self.make_book(copies=1)
+        response = self.client.post(
+            '/api/reservations/reserve/', {'book_id': book.pk, 'member_id': self.make_member().pk}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['book_id'], ['Copies are available; issue the book instead.'])
+
+    def test_queue_positions(self):
+        book, _ = self.lend_last_copy()
+        first, second = self.reserve(book, self.make_member()), self.reserve(book, self.make_member())
+        response = self.client.get(f'/api/reservations/?book={book.pk}')
+        positions = {row['id']: row['queue_position'] for row in response.data['results']}
+        self.assertEqual(positions, {first.pk: 1, second.pk: 2})
+
+    def test_return_holds_the_copy_for_the_head_of_the_queue(self):
+        book, record_id = self.lend_last_copy()
+        first, second = self.make_member(), self.make_member()
+        head, next_in_line = self.reserve(book, first), self.reserve(book, second)
+
+        self.assertEqual(self.return_loan(record_id).status_code, 200)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+        head.refresh_from_db()
+        self.assertEqual(head.status, 'ready')
+        self.assertEqual(head.hold_expires_at, head.ready_at + circulation.HOLD_PERIOD)
+        self.assertStatus(next_in_line, 'waiting')
+
+        # Only the member the copy is held for can take it
+        self.assertEqual(self.issue(book, second).status_code, 400)
+        self.assertEqual(self.issue(book, first).status_code, 201)
+        self.assertStatus(head, 'fulfilled')
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+
+    def test_return_with_nobody_waiting_shelves_the_copy(self):
+        book, record_id = self.lend_last_copy()
+        self.reserve(book, self.make_member())
+        Reservation.objects.update(status='cancelled')
+        self.return_loan(record_id)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+
+    def test_expired_hold_passes_to_the_next_in_line(self):
+        book, record_id = self.lend_last_copy()
+        head, next_in_line = self.reserve(book, self.make_member()), self.reserve(book, self.make_member())
+        self.return_loan(record_id)
+        self.assertEqual(circulation.expire_holds(), 0)
+
+        Reservation.objects.filter(pk=head.pk).update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(circulation.expire_holds(), 1)
+        self.assertStatus(head, 'expired')
+        self.assertStatus(next_in_line, 'ready')
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+
+    def test_expired_hold_with_nobody_waiting_shelves_the_copy(self):
+        book, record_id = self.lend_last_copy()
+        head = self.reserve(book, self.make_member())
+        self.return_loan(record_id)
+        circulation.expire_holds(now=timezone.now() + circulation.HOLD_PERIOD + timedelta(minutes=1))
+        self.assertStatus(head, 'expired')
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+
+    def test_cancelling_a_hold_passes_the_copy_on(self):
+        book, record_id = self.lend_last_copy()
+        head, next_in_line = self.reserve(book, self.make_member()), self.reserve(book, self.make_member())
+        self.return_loan(record_id)
+
+        response = self.client.post('/api/reservations/cancel/', {'reservation_id': head.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'cancelled')
+        self.assertStatus(next_in_line, 'ready')
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+
+    def test_cancelling_the_last_hold_shelves_the_copy(self):
+        book, record_id = self.lend_last_copy()
+        head = self.reserve(book, self.make_member())
+        self.return_loan(record_id)
+        self.client.post('/api/reservations/cancel/', {'reservation_id': head.pk}, format='json')
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 1)
+
+    def test_cancelling_a_waiting_reservation_leaves_the_copies_alone(self):
+        book, _ = self.lend_last_copy()
+        waiting = self.reserve(book, self.make_member())
+        response = self.client.post('/api/reservations/cancel/', {'reservation_id': waiting.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        book.refresh_from_db()
+        self.assertEqual(book.available_copies, 0)
+        response = self.client.post('/api/reservations/cancel/', {'reservation_id': waiting.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MAX_ACTIVE_LOANS=2, MAX_OUTSTANDING_FINES=Decimal('10.00'))
+class MemberLimitTests(CirculationTestCase):
+    def test_loan_limit_refuses_the_next_checkout(self):
+        member = self.make_member()
+        for _ in range(2):
+            self.assertEqual(self.issue(self.make_book(), member).status_code, 201)
+        book = self.make_book()
+        response = self.issue(book, member)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['member_id'], ['Member already has 2 books on loan; the limit is 2.'])
+        book.refresh_from_db()
+        member.refresh_from_db()
+        # The copy taken before the limit check was put back
+        self.assertEqual(book.available_copies, 1)
+        self.assertEqual(member.active_loans, 2)
+
+    def test_return_frees_a_loan_slot(self):
+        member = self.make_member()
+        record_id = self.issue(self.make_book(), member).data['id']
+        self.issue(self.make_book(), member)
+        self.return_loan(record_id)
+        self.assertEqual(self.issue(self.make_book(), member).status_code, 201)
+
+    def test_fine_limit_refuses_checkouts(self):
+        member = self.make_member(outstanding_fines=Decimal('12.50'))
+        response = self.issue(self.make_book(), member)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['member_id'], ['Member owes $12.50 in fines; borrowing is blocked above $10.00.']
+        )
+        member.refresh_from_db()
+        self.assertEqual(member.active_loans, 0)
+
+    def test_fines_at_the_limit_still_borrow(self):
+        member = self.make_member(outstanding_fines=Decimal('10.00'))
+        self.assertEqual(self.issue(self.make_book(), member).status_code, 201)
+
+    def test_returning_a_fined_loan_clears_its_fine(self):
+        member = self.make_member()
+        record = IssueRecord.objects.get(pk=self.issue(self.make_book(), member).data['id'])
+        # What the overdue sweeper leaves on a loan five days late
+        IssueRecord.objects.filter(pk=record.pk).update(
+            due_date=date.today() - timedelta(days=5), status='overdue', fine_amount=Decimal('12.50'),
+        )
+        Member.objects.filter(pk=member.pk).update(outstanding_fines=Decimal('12.50'))
+        self.assertEqual(self.issue(self.make_book(), member).status_code, 400)
+
+        self.assertEqual(self.return_loan(record.pk).status_code, 200)
+        member.refresh_from_db()
+        self.assertEqual((member.active_loans, member.outstanding_fines), (0, Decimal('0.00')))
+        self.assertEqual(self.issue(self.make_book(), member).status_code, 201)
+
+    def test_bulk_issue_stops_at_the_limit(self):
+        member = self.make_member()
+        books = [self.make_book() for _ in range(3)]
+        response = self.client.post('/api/issues/bulk_issue/', {
+            'items': [{'book_id': book.pk, 'member_id': member.pk} for book in books],
+        }, format='json')
+        self.assertEqual([item['ok'] for item in response.data['results']], [True, True, False])
+        member.refresh_from_db()
+        self.assertEqual(member.active_loans, 2)
+        books[2].refresh_from_db()
+        self.assertEqual(books[2].available_copies, 1)
+
+
+class MemberCounterRepairTests(CirculationTestCase):
+    def test_drift_is_reported_and_repaired(self):
+        member, untouched = self.make_member(), self.make_member()
+        self.issue(self.make_book(), member)
+        self.issue(self.make_book(), untouched)
+        record = IssueRecord.objects.filter(member=member).get()
+        IssueRecord.objects.filter(pk=record.pk).update(fine_amount=Decimal('3.00'))
+        # Counters knocked out of step, as a bulk load outside the app would
+        Member.objects.filter(pk=member.pk).update(active_loans=4, outstanding_fines=Decimal('0'))
+
+        self.assertEqual(
+            circulation.member_counter_drift(),
+            [(member.pk, member.member_id, 4, 1, Decimal('0'), Decimal('3.00'))],
+        )
+        self.assertEqual(circulation.repair_member_counters([member.pk]), 1)
+        self.assertEqual(circulation.member_counter_drift(), [])
+        member.refresh_from_db()
+        self.assertEqual((member.active_loans, member.outstanding_fines), (1, Decimal('3.00')))
+
+    def test_repair_all_members_in_batches(self):
+        members = [self.make_member(active_loans=3) for _ in range(5)]
+        self.issue(self.make_book(), members[0])
+        self.assertEqual(len(circulation.member_counter_drift()), 5)
+        self.assertEqual(circulation.repair_member_counters(batch_size=2), 5)
+        self.assertEqual(circulation.member_counter_drift(), [])
+        self.assertEqual(
+            list(Member.objects.order_by('id').values_list('active_loans', flat=True)), [1, 0, 0, 0, 0]
+        )
@@ -0,0 +1,240 @@
+"""
+In-memory prefix indexes for the book and member typeahead endpoints.
+
+Every word of a record's title/author/ISBN (books) or name/username/member id
+(members) is normalized and kept in a sorted array, so a keystroke is a
+bisect plus a short scan. Each worker process builds its indexes lazily on
+first use, and signals apply saves and deletes incrementally. Changes made by
+other processes are picked up by a rebuild, triggered when the version
+counter in the response cache moves (only with a shared CACHE_BACKEND; under
+locmem each worker counts alone) or when the index is older than
+TYPEAHEAD_MAX_AGE seconds. Rebuilds after the first run on a background
+thread while requests keep searching the previous index.
+"""
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .caching import get_cache
+from .models import Book, Member
+
+JOINERS_RE = re.compile(r"['’-]")
+SEPARATORS_RE = re.compile(r'[\W_]+', re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    """Accent- and case-folded text; hyphens and apostrophes are dropped so ISBNs and names stay whole"""
+    text = text or ''
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = text.casefold()
+    return SEPARATORS_RE.sub(' ', JOINERS_RE.sub('', text)).strip()
+
+
+def max_results():
+    return getattr(settings, 'TYPEAHEAD_MAX_RESULTS', 20)
+
+
+def max_age():
+    return getattr(settings, 'TYPEAHEAD_MAX_AGE', 60)
+
+
+class PrefixIndex:
+    """
+    Sorted ``(key, id)`` arrays plus ``id -> (payload, normalized text)``.
+
+    ``loader`` yields ``(id, payload, texts)`` for every record. ``payload``
+    is what the endpoint returns and ``texts`` are the strings to match.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.lock = threading.RLock()
+        self.keys = []
+        self.ids = []
+        self.items = {}
+        self.version = None
+        self.built_at = None
+        self.rebuilding = False
+
+    @property
+    def version_key(self):
+        return f'library:typeahead:{self.name}:version'
+
+    def shared_version(self):
+        return get_cache().get(self.version_key, 0)
+
+    def ensure_fresh(self):
+        version = self.shared_version()
+        if self.version is None:
+            # Nothing to serve yet, so the first build runs in the request
+            self.rebuild(version)
+        elif version != self.version or time.monotonic() - self.built_at >= max_age():
+            self.rebuild_in_background()
+
+    def rebuild_in_background(self):
+        with self.lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+        threading.Thread(target=self._background_rebuild, name=f'typeahead-{self.name}', daemon=True).start()
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('Rebuilding the %s typeahead index failed', self.name)
+        finally:
+            self.rebuilding = False
+            connection.close()
+
+    def rebuild(self, version=None):
+        version = self.shared_version() if version is None else version
+        items, entries = {}, []
+        for pk, payload, texts in self.loader():
+            text = normalize(' '.join(filter(None, texts)))
+            items[pk] = (payload, text)
+            entries.extend((sys.intern(token), pk) for token in set(text.split()))
+        entries.sort()
+        with self.lock:
+            self.keys = [key for key, _ in entries]
+            self.ids = [pk for _, pk in entries]
+            self.items = items
+            self.version = version
+            self.built_at = time.monotonic()
+
+    def _remove(self, pk):
+        _, text = self.items.pop(pk, (None, ''))
+        for token in set(text.split()):
+            index = bisect_left(self.keys, token)
+            while index < len(self.keys) and self.keys[index] == token:
+                if self.ids[index] == pk:
+                    del self.keys[index]
+                    del self.ids[index]
+                    break
+                index += 1
+
+    def put(self, pk, payload, texts):
+        text = normalize(' '.join(filter(None, texts)))
+        with self.lock:
+            self._remove(pk)
+            self.items[pk] = (payload, text)
+            for token in set(text.split()):
+                # Keep ids sorted within a key so scans are deterministic
+                index = bisect_left(self.keys, token)
+                while index < len(self.keys) and self.keys[index] == token and self.ids[index] < pk:
+                    index += 1
+                self.keys.insert(index, sys.intern(token))
+                self.ids.insert(index, pk)
+
+    def search(self, query, limit):
+        """Up to ``limit`` payloads whose words start with every word of ``query``"""
+        tokens = normalize(query).split()
+        if not tokens:
+            return []
+        # Scan on the longest word (fewest candidates) and check the rest per item
+        probe = max(tokens, key=len)
+        results, seen = [], set()
+        with self.lock:
+            index = bisect_left(self.keys, probe)
+            while index < len(self.keys) and len(results) < limit:
+                if not self.keys[index].startswith(probe):
+                    break
+                pk = self.ids[index]
+                index += 1
+                if pk in seen:
+                    continue
+                seen.add(pk)
+                payload, text = self.items[pk]
+                words = text.split()
+                if all(any(word.startswith(token) for word in words) for token in tokens):
+                    results.append(payload)
+        return results
+
+    def changed(self, pk, payload=None, texts=None):
+        """Once committed, apply a save (or a delete, without payload) and tell other processes"""
+        transaction.on_commit(lambda: self._apply(pk, payload, texts))
+
+    def _apply(self, pk, payload, texts):
+        with self.lock:
+            if self.version is None:
+                self._bump()
+                return
+            if payload is None:
+                self._remove(pk)
+            else:
+                self.put(pk, payload, texts)
+            # Only this process changed since our build: stay current without a rebuild
+            version = self._bump()
+            if version == self.version + 1:
+                self.version = version
+
+    def invalidate(self):
+        """Force every process to rebuild, e.g. after a bulk load"""
+        transaction.on_commit(self._bump)
+
+    def _bump(self):
+        cache = get_cache()
+        try:
+            return cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 1, None)
+            return cache.get(self.version_key, 1)
+
+
+def book_row(pk, title, author, isbn):
+    payload = {'id': pk, 'title': title, 'author': author, 'isbn': isbn}
+    return pk, payload, (title, author, isbn)
+
+
+def member_row(pk, member_id, first_name, last_name, username):
+    name = f'{first_name} {last_name}'.strip() or username
+    payload = {'id': pk, 'member_id': member_id, 'name': name}
+    return pk, payload, (first_name, last_name, username, member_id)
+
+
+def _load_books():
+    rows = Book.objects.values_list('id', 'title', 'author', 'isbn')
+    return (book_row(*row) for row in rows.iterator(chunk_size=2000))
+
+
+def _load_members():
+    rows = Member.objects.filter(is_active=True).values_list(
+        'id', 'member_id', 'user__first_name', 'user__last_name', 'user__username'
+    )
+    return (member_row(*row) for row in rows.iterator(chunk_size=2000))
+
+
+books = PrefixIndex('books', _load_books)
+members = PrefixIndex('members', _load_members)
+
+
+def suggest_books(query, limit, available_only=False):
+    books.ensure_fresh()
+    # Availability changes on every checkout, so it is read live rather than indexed
+    candidates = books.search(query, limit * 5 if available_only else limit)
+    counts = dict(
+        Book.objects.filter(id__in=[row['id'] for row in candidates]).values_list('id', 'available_copies')
+    )
+    results = [
+        dict(row, available_copies=counts[row['id']])
+        for row in candidates
+        if row['id'] in counts and (counts[row['id']] > 0 or not available_only)
+    ]
+    return results[:limit]
+
+
+def suggest_members(query, limit):
+    members.ensure_fresh()
+    return members.search(query, limit)
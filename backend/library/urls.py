@@ -1,12 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, MemberViewSet, IssueRecordViewSet, AuthViewSet
+from .views import (
+    BookViewSet, MemberViewSet, IssueRecordViewSet, ReservationViewSet, AuthViewSet, StatsViewSet,
+    ReportViewSet
+)
 
 router = DefaultRouter()
 router.register(r'books', BookViewSet, basename='book')
 router.register(r'members', MemberViewSet, basename='member')
 router.register(r'issues', IssueRecordViewSet, basename='issue')
+router.register(r'reservations', ReservationViewSet, basename='reservation')
 router.register(r'auth', AuthViewSet, basename='auth')
+router.register(r'stats', StatsViewSet, basename='stats')
+router.register(r'reports', ReportViewSet, basename='report')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,47 +1,114 @@
+import io
+from dataclasses import asdict
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.contrib.auth.models import User
-from .models import Book, Member, IssueRecord
+from django.utils import timezone
+from .models import Book, Member, IssueRecord, Reservation
 from .serializers import (
     UserSerializer, RegisterSerializer, BookSerializer, MemberSerializer,
-    IssueRecordSerializer, IssueBookSerializer, ReturnBookSerializer
+    IssueRecordSerializer, IssueBookSerializer, ReturnBookSerializer,
+    BulkIssueSerializer, BulkReturnSerializer, ReservationSerializer, ReserveBookSerializer,
+    CancelReservationSerializer, RelatedBookSerializer
 )
-from django.db.models import Q
+from .budgets import QueryBudgetMixin
+from .caching import CachedResponseMixin
+from .search import search_books
+from .stats import get_stats
+from . import analytics, catalog_import, circulation, exports, typeahead
+from .streaming import PaginatedActionMixin, streaming_response
+from django.db.models import F, Q
+
 
+def typeahead_limit(request, default=10):
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, typeahead.max_results()))
 
-class BookViewSet(viewsets.ModelViewSet):
+
+class BookViewSet(CachedResponseMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [AllowAny]  # Allow anyone to view books
+    keyset_ordering = '-created_at'
+    fast_serializer_classes = (BookSerializer,)
 
     def get_queryset(self):
         queryset = Book.objects.all()
         search = self.request.query_params.get('search', None)
         if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search) |
-                Q(author__icontains=search) |
-                Q(isbn__icontains=search)
-            )
+            queryset = search_books(queryset, search)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(lambda: self.list_response(self.filter_queryset(self.get_queryset())))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(lambda: super(BookViewSet, self).retrieve(request, *args, **kwargs))
+
     @action(detail=False, methods=['get'])
     def available(self, request):
         """Get all available books (available_copies > 0)"""
         books = self.get_queryset().filter(available_copies__gt=0)
-        serializer = self.get_serializer(books, many=True)
-        return Response(serializer.data)
+        return self.cached_response(lambda: self.list_response(books))
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """Books most often borrowed by the same members, best first"""
+        def build():
+            # One range scan on the (book, rank) index, joined to the books
+            books = (
+                Book.objects.filter(recommended_with__book_id=pk)
+                .annotate(together=F('recommended_with__together'))
+                .order_by('recommended_with__rank')
+            )
+            return Response(RelatedBookSerializer(books, many=True).data)
+        return self.cached_response(build)
+
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser],
+            permission_classes=[IsAdminUser])
+    def import_catalog(self, request):
+        """Upsert books on ISBN from an uploaded CSV, NDJSON or MARC-like ``file``"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.data.get('format') or catalog_import.detect_format(upload.name)
+        if fmt not in catalog_import.FORMATS:
+            return Response(
+                {'format': [f"Expected one of: {', '.join(catalog_import.FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Read straight from the spooled upload, one record at a time
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        return Response(asdict(catalog_import.import_catalog(stream, fmt)))
+
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        """Title/author/ISBN prefix suggestions; ?available=1 skips books with no copies left"""
+        available_only = request.query_params.get('available') in ('1', 'true')
+        return Response(typeahead.suggest_books(
+            request.query_params.get('q', ''), typeahead_limit(request), available_only
+        ))
 
 
-class MemberViewSet(viewsets.ModelViewSet):
+class MemberViewSet(QueryBudgetMixin, PaginatedActionMixin, viewsets.ModelViewSet):
     queryset = Member.objects.all()
     serializer_class = MemberSerializer
     permission_classes = [IsAuthenticated]
+    keyset_ordering = '-date_joined'
+    fast_serializer_classes = (IssueRecordSerializer,)
+    # auth user + count + page; issues adds the member lookup, typeahead
+    # needs only the auth user (plus the index load on a cold worker)
+    query_budget = {'list': 3, 'retrieve': 2, 'issues': 4, 'typeahead': 2}
 
     def get_queryset(self):
-        queryset = Member.objects.filter(is_active=True)
+        queryset = Member.objects.filter(is_active=True).select_related('user')
         search = self.request.query_params.get('search', None)
         if search:
             queryset = queryset.filter(
@@ -55,23 +122,56 @@ class MemberViewSet(viewsets.ModelViewSet):
     def issues(self, request, pk=None):
         """Get all issue records for a member"""
         member = self.get_object()
-        issues = IssueRecord.objects.filter(member=member).order_by('-issue_date')
-        serializer = IssueRecordSerializer(issues, many=True)
-        return Response(serializer.data)
+        issues = (
+            IssueRecord.objects.filter(member=member)
+            .select_related('book', 'member__user')
+            .order_by('-issue_date')
+        )
+        return self.list_response(issues, IssueRecordSerializer, keyset_ordering='-issue_date')
+
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        """Name/username/member id prefix suggestions for active members"""
+        return Response(typeahead.suggest_members(request.query_params.get('q', ''), typeahead_limit(request)))
 
 
-class IssueRecordViewSet(viewsets.ReadOnlyModelViewSet):
+class IssueRecordViewSet(QueryBudgetMixin, PaginatedActionMixin, viewsets.ReadOnlyModelViewSet):
     queryset = IssueRecord.objects.all()
     serializer_class = IssueRecordSerializer
     permission_classes = [IsAuthenticated]
+    keyset_ordering = '-issue_date'
+    fast_serializer_classes = (IssueRecordSerializer,)
+    # auth user + count + page, independent of page size
+    query_budget = {'list': 3, 'retrieve': 2}
 
     def get_queryset(self):
-        queryset = IssueRecord.objects.all()
+        queryset = IssueRecord.objects.select_related('book', 'member__user')
         status_filter = self.request.query_params.get('status', None)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Stream issue records joined with book and member fields as CSV or
+        NDJSON (``?output=``), filtered by ``?status=issued,overdue`` and an
+        inclusive ``?start=``/``?end=`` range on ``?date_field=``.
+        """
+        params = exports.IssueExportFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = dict(params.validated_data)
+        output = filters.pop('output')
+
+        rows = exports.issue_export_rows(**filters)
+        response = streaming_response(request, exports.WRITERS[output](rows), exports.EXPORT_FORMATS[output])
+        filename = f"issues-{timezone.now():%Y%m%d}.{output}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
     @action(detail=False, methods=['post'])
     def issue(self, request):
         """Issue a book to a member"""
@@ -92,6 +192,86 @@ class IssueRecordViewSet(viewsets.ReadOnlyModelViewSet):
             return Response(response_serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def bulk_issue(self, request):
+        """Issue a batch of books, e.g. a stack scanned at the desk"""
+        serializer = BulkIssueSerializer(data=request.data)
+        if serializer.is_valid():
+            return Response(self._bulk_results(serializer.save()), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def bulk_return(self, request):
+        """Return a batch of issue records"""
+        serializer = BulkReturnSerializer(data=request.data)
+        if serializer.is_valid():
+            return Response(self._bulk_results(serializer.save()), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def _bulk_results(self, results):
+        """Per-item outcome list in request order plus success/failure totals"""
+        items = []
+        for index, (issue_record, errors) in enumerate(results):
+            if errors:
+                items.append({'index': index, 'ok': False, 'errors': errors})
+            else:
+                items.append({'index': index, 'ok': True, 'issue_record': IssueRecordSerializer(issue_record).data})
+        succeeded = sum(1 for item in items if item['ok'])
+        return {'succeeded': succeeded, 'failed': len(items) - succeeded, 'results': items}
+
+
+class ReservationViewSet(QueryBudgetMixin, PaginatedActionMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Reservation.objects.all()
+    serializer_class = ReservationSerializer
+    permission_classes = [IsAuthenticated]
+    keyset_ordering = '-created_at'
+    # auth user + count + page (queue positions are subqueries of the page
+    # query); mine adds the member lookup
+    query_budget = {'list': 3, 'retrieve': 2, 'mine': 4}
+
+    def get_queryset(self):
+        queryset = circulation.with_queue_position(
+            Reservation.objects.select_related('book', 'member__user')
+        )
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if params.get('book'):
+            queryset = queryset.filter(book_id=params['book'])
+        if params.get('member'):
+            queryset = queryset.filter(member_id=params['member'])
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    @action(detail=False, methods=['get'])
+    def mine(self, request):
+        """The current user's waiting reservations and holds ready for pickup"""
+        member = getattr(request.user, 'member', None)
+        if member is None:
+            return self.list_response(Reservation.objects.none())
+        holds = self.get_queryset().filter(member=member, status__in=Reservation.ACTIVE_STATUSES)
+        return self.list_response(holds)
+
+    @action(detail=False, methods=['post'])
+    def reserve(self, request):
+        """Join the reservation queue of a book with no copies on the shelf"""
+        serializer = ReserveBookSerializer(data=request.data)
+        if serializer.is_valid():
+            reservation = serializer.save()
+            return Response(ReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def cancel(self, request):
+        """Cancel a reservation; a copy on hold goes to the next member in line"""
+        serializer = CancelReservationSerializer(data=request.data)
+        if serializer.is_valid():
+            reservation = serializer.save()
+            return Response(ReservationSerializer(reservation).data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 
 class AuthViewSet(viewsets.ViewSet):
     permission_classes = [AllowAny]
@@ -126,7 +306,9 @@ class AuthViewSet(viewsets.ViewSet):
         """Get current user information"""
         user_serializer = UserSerializer(request.user)
         try:
-            member = request.user.member
+            # Read afresh: the authenticated user may be a cached copy, and
+            # circulation moves active_loans/outstanding_fines with update()
+            member = Member.objects.get(user_id=request.user.pk)
             member_serializer = MemberSerializer(member)
             return Response({
                 'user': user_serializer.data,
@@ -137,3 +319,55 @@ class AuthViewSet(viewsets.ViewSet):
                 'user': user_serializer.data,
                 'member': None
             })
+
+
+class StatsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        """Dashboard totals served from cached aggregates"""
+        return Response(get_stats())
+
+
+class ReportViewSet(QueryBudgetMixin, viewsets.ViewSet):
+    """
+    Circulation reports answered from the analytics rollups. Every report
+    takes an inclusive ``?start=``/``?end=`` range (default: the last 30
+    days); member and monthly reports cover the whole months in the range.
+    """
+    permission_classes = [IsAdminUser]
+    # auth user + one rollup query (popular also loads its top titles),
+    # whatever the size of the loan history
+    query_budget = {'popular': 3, 'members': 2, 'loans': 2, 'fines': 2}
+
+    def _params(self, request):
+        params = analytics.ReportFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.validated_data
+
+    def _report(self, params, results):
+        return Response({'start': params['start'], 'end': params['end'], 'results': results})
+
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """Most borrowed titles (``?limit=``)"""
+        params = self._params(request)
+        return self._report(params, analytics.popular_titles(params['start'], params['end'], params['limit']))
+
+    @action(detail=False, methods=['get'])
+    def members(self, request):
+        """Members with the most loans (``?limit=``)"""
+        params = self._params(request)
+        return self._report(params, analytics.active_members(params['start'], params['end'], params['limit']))
+
+    @action(detail=False, methods=['get'])
+    def loans(self, request):
+        """Loans, returns and fines collected per day"""
+        params = self._params(request)
+        return self._report(params, analytics.loans_per_day(params['start'], params['end']))
+
+    @action(detail=False, methods=['get'])
+    def fines(self, request):
+        """Fines collected per day or per month (``?interval=day|month``)"""
+        params = self._params(request)
+        return self._report(params, analytics.fine_revenue(params['start'], params['end'], params['interval']))
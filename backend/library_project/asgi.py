@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_project.settings')
+# Serving through this module switches on the async read views
+os.environ.setdefault('ASGI_MODE', 'True')
 
 application = get_asgi_application()
+
+if settings.ASGI_MODE and settings.DEBUG:
+    # Development only, standing in for WhiteNoise (sync-only) for the admin
+    # and browsable API assets; in production the web server serves STATIC_ROOT
+    application = ASGIStaticFilesHandler(application)
@@ -4,7 +4,9 @@ Django settings for library_project project.
 
 from pathlib import Path
 from datetime import timedelta
+from decimal import Decimal
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -33,6 +35,8 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework_simplejwt',
+    # Refresh tokens are blacklisted on rotation (SIMPLE_JWT below) and logout
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'library',
 ]
@@ -49,7 +53,27 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'library_project.urls'
+# Opt-in per-view timing/query metrics (see library/metrics.py).
+# Keep the sample rate low in production; unsampled requests skip all bookkeeping.
+REQUEST_METRICS_ENABLED = config('REQUEST_METRICS_ENABLED', default=False, cast=bool)
+REQUEST_METRICS_SAMPLE_RATE = config('REQUEST_METRICS_SAMPLE_RATE', default=1.0, cast=float)
+# /api/metrics/ answers staff users, or a scraper sending "Authorization: Bearer <token>"
+REQUEST_METRICS_TOKEN = config('REQUEST_METRICS_TOKEN', default='')
+
+if REQUEST_METRICS_ENABLED:
+    MIDDLEWARE.insert(1, 'library.metrics.RequestMetricsMiddleware')
+
+# ASGI deployment (set by library_project/asgi.py): urls_asgi.py routes book
+# and issue reads to async views (library/async_views.py). WhiteNoise is
+# sync-only and would push every request through a thread, so it is left out:
+# asgi.py serves static files under DEBUG, and in production the web server
+# serves STATIC_ROOT.
+ASGI_MODE = config('ASGI_MODE', default=False, cast=bool)
+
+if ASGI_MODE:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
+ROOT_URLCONF = 'library_project.urls_asgi' if ASGI_MODE else 'library_project.urls'
 
 TEMPLATES = [
     {
@@ -112,6 +136,65 @@ else:
         }
 
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Same backend, with write transactions that wait for each other instead
+    # of failing (library_project/sqlite3/base.py)
+    DATABASES['default']['ENGINE'] = 'library_project.sqlite3'
+
+# Under ASGI each request runs its queries on a fresh thread, so persistent
+# connections would never be reused
+if ASGI_MODE:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+
+# Cache
+# CACHE_BACKEND selects locmem (default, per process), file (shared by the
+# workers on one host) or redis (shared across hosts, needs REDIS_URL).
+# Invalidation goes through this cache too: under locmem a write on one
+# worker does not reach the other workers' cached book responses, JWT users
+# or typeahead indexes, which catch up only as RESPONSE_CACHE_TIMEOUT,
+# JWT_USER_CACHE_TTL and TYPEAHEAD_MAX_AGE run out. Use file or redis when
+# gunicorn runs more than one worker (gunicorn_config.py does).
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'library',
+        }
+    }
+
+# Seconds a cached book list/detail/available response is served. Under
+# locmem this also bounds how stale another worker's copy can be, so the
+# default there is short.
+RESPONSE_CACHE_TIMEOUT = config(
+    'RESPONSE_CACHE_TIMEOUT', default=10 if CACHE_BACKEND == 'locmem' else 300, cast=int
+)
+
+# Relays availability stream events between worker processes through the
+# cache (library/availability.py). Events are numbered with the cache's INCR,
+# which only redis makes atomic across processes. On by default for ASGI
+# workers on redis; enable it on sync workers that share the stream's redis.
+AVAILABILITY_RELAY = config('AVAILABILITY_RELAY', default=ASGI_MODE and CACHE_BACKEND == 'redis', cast=bool)
+if AVAILABILITY_RELAY and CACHE_BACKEND != 'redis':
+    raise ImproperlyConfigured('AVAILABILITY_RELAY needs CACHE_BACKEND=redis.')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -160,15 +243,40 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'library.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # Same bytes as DRF's JSONRenderer, faster when orjson is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'library.fastpath.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Page numbers by default; ?paginate=cursor switches to keyset pagination
+    'DEFAULT_PAGINATION_CLASS': 'library.pagination.LibraryPagination',
     'PAGE_SIZE': 10
 }
 
+# Catalog search: maximum number of ranked full-text matches returned
+SEARCH_RESULT_LIMIT = config('SEARCH_RESULT_LIMIT', default=500, cast=int)
+
+# Typeahead: upper bound for ?limit= on the books/members typeahead endpoints
+TYPEAHEAD_MAX_RESULTS = config('TYPEAHEAD_MAX_RESULTS', default=20, cast=int)
+# Seconds before a worker rebuilds its typeahead indexes to pick up changes
+# made by other workers (without a shared cache this is the only way)
+TYPEAHEAD_MAX_AGE = config('TYPEAHEAD_MAX_AGE', default=60, cast=int)
+
+# Checkout policy (library/circulation.py): no member may hold more than
+# MAX_ACTIVE_LOANS books at once (0 for no limit), or borrow at all while the
+# fines on their overdue loans exceed MAX_OUTSTANDING_FINES
+MAX_ACTIVE_LOANS = config('MAX_ACTIVE_LOANS', default=5, cast=int)
+MAX_OUTSTANDING_FINES = config('MAX_OUTSTANDING_FINES', default='10.00', cast=Decimal)
+
+# Per-endpoint query budgets (see library/budgets.py)
+QUERY_BUDGET_CHECKS = config('QUERY_BUDGET_CHECKS', default=DEBUG, cast=bool)
+QUERY_BUDGET_STRICT = config('QUERY_BUDGET_STRICT', default=False, cast=bool)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
@@ -178,6 +286,15 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Seconds each worker keeps a token's user and member profile before reloading
+# them (library/authentication.py); saves invalidate sooner. 0 loads them on
+# every request.
+JWT_USER_CACHE_TTL = config('JWT_USER_CACHE_TTL', default=60, cast=int)
+
+# Seconds /api/stats/ keeps its totals (library/stats.py). Checkouts and
+# returns don't invalidate them, so loan counts can lag by this much.
+STATS_CACHE_TTL = config('STATS_CACHE_TTL', default=30, cast=int)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
@@ -0,0 +1,22 @@
+"""
+SQLite backend whose transactions start with ``BEGIN IMMEDIATE``.
+
+With the default deferred ``BEGIN``, a transaction that reads before it
+writes cannot upgrade its lock while another connection is writing, and
+SQLite fails it with "database is locked" at once instead of waiting out
+the busy timeout. Circulation transactions always read first, so concurrent
+checkouts on the development database turned into 500s. Taking the write
+lock up front makes them queue instead (Django 5.1's ``transaction_mode``
+option does the same).
+
+Only ``atomic()`` blocks start a transaction. Reads outside one (list and
+detail views, exports, streams, reports) run in autocommit and take a
+shared lock per statement, so they never wait for the write lock. Keep
+read-only paths out of ``atomic()``, or they will queue behind writers.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
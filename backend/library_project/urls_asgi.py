@@ -0,0 +1,15 @@
+"""
+URL configuration for ASGI deployments: the async read views in
+library/async_views.py take precedence over the matching DRF routes, and the
+availability event stream is only served here.
+"""
+from django.urls import path, include
+from library.async_views import async_urlpatterns, availability_stream
+from library.urls import router
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/books/availability/stream/', availability_stream, name='book-availability-stream'),
+    path('api/', include(async_urlpatterns(router.urls))),
+] + sync_urlpatterns
@@ -0,0 +1,69 @@
+import React, { useState, useEffect, useRef } from 'react';
+import api from '../services/api';
+
+const DEBOUNCE_MS = 150;
+
+const Typeahead = ({ endpoint, params, placeholder, formatItem, onSelect }) => {
+  const [query, setQuery] = useState('');
+  const [suggestions, setSuggestions] = useState([]);
+  const [open, setOpen] = useState(false);
+  const latestRequest = useRef(0);
+
+  useEffect(() => {
+    if (!query.trim()) {
+      setSuggestions([]);
+      return undefined;
+    }
+    const timer = setTimeout(async () => {
+      const requestId = ++latestRequest.current;
+      try {
+        const response = await api.get(endpoint, { params: { ...params, q: query } });
+        // Ignore responses that arrive after a newer keystroke
+        if (requestId === latestRequest.current) {
+          setSuggestions(response.data);
+        }
+      } catch (error) {
+        console.error('Error fetching suggestions:', error);
+      }
+    }, DEBOUNCE_MS);
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [query, endpoint]);
+
+  const handleChange = (e) => {
+    setQuery(e.target.value);
+    setOpen(true);
+    onSelect(null);
+  };
+
+  const handleSelect = (item) => {
+    setQuery(formatItem(item));
+    setOpen(false);
+    onSelect(item);
+  };
+
+  return (
+    <div className="typeahead">
+      <input
+        type="text"
+        value={query}
+        onChange={handleChange}
+        onFocus={() => setOpen(true)}
+        onBlur={() => setTimeout(() => setOpen(false), 150)}
+        placeholder={placeholder}
+        autoComplete="off"
+      />
+      {open && suggestions.length > 0 && (
+        <ul className="typeahead-menu">
+          {suggestions.map((item) => (
+            <li key={item.id} onMouseDown={() => handleSelect(item)}>
+              {formatItem(item)}
+            </li>
+          ))}
+        </ul>
+      )}
+    </div>
+  );
+};
+
+export default Typeahead;
@@ -64,6 +64,11 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    const refresh = localStorage.getItem('refresh_token');
+    if (refresh) {
+      // Blacklist the refresh token; the local session ends either way
+      api.post('/token/blacklist/', { refresh }).catch(() => {});
+    }
     localStorage.removeItem('access_token');
     localStorage.removeItem('refresh_token');
     delete api.defaults.headers.common['Authorization'];
@@ -1,15 +1,20 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import api from '../services/api';
+import { useAuth } from '../contexts/AuthContext';
 
 const BookDetail = () => {
   const { id } = useParams();
   const [book, setBook] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  const [hold, setHold] = useState(null);
+  const [related, setRelated] = useState([]);
+  const { user } = useAuth();
 
   useEffect(() => {
     fetchBook();
+    fetchRelated();
   }, [id]);
 
   const fetchBook = async () => {
@@ -23,6 +28,29 @@ const BookDetail = () => {
     }
   };
 
+  const fetchRelated = async () => {
+    try {
+      const response = await api.get(`/books/${id}/related/`);
+      setRelated(response.data);
+    } catch (error) {
+      setRelated([]);
+    }
+  };
+
+  const placeHold = async () => {
+    try {
+      const response = await api.post('/reservations/reserve/', {
+        book_id: book.id,
+        member_id: user.member.id,
+      });
+      setHold({ ok: true, message: `You are #${response.data.queue_position} in line for this book.` });
+    } catch (error) {
+      const errors = error.response?.data || {};
+      const messages = Object.values(errors).flat();
+      setHold({ ok: false, message: messages[0] || 'Could not place a hold' });
+    }
+  };
+
   if (loading) {
     return <div className="loading">Loading book details...</div>;
   }
@@ -106,6 +134,43 @@ const BookDetail = () => {
           </Link>
         </div>
       )}
+
+      {book.available_copies === 0 && user?.member && (
+        <div style={{ marginTop: '20px' }}>
+          {hold ? (
+            <div className={`alert ${hold.ok ? 'alert-success' : 'alert-error'}`}>{hold.message}</div>
+          ) : (
+            <button className="btn btn-primary" onClick={placeHold}>
+              Place Hold
+            </button>
+          )}
+        </div>
+      )}
+
+      {related.length > 0 && (
+        <div className="card" style={{ marginTop: '20px' }}>
+          <h2>Borrowed Together</h2>
+          <table className="table">
+            <tbody>
+              {related.map((other) => (
+                <tr key={other.id}>
+                  <td>
+                    <Link to={`/books/${other.id}`}>{other.title}</Link>
+                  </td>
+                  <td>{other.author}</td>
+                  <td>
+                    {other.available_copies > 0 ? (
+                      <span className="badge badge-available">Available</span>
+                    ) : (
+                      <span className="badge badge-unavailable">Unavailable</span>
+                    )}
+                  </td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </div>
+      )}
     </div>
   );
 };
@@ -11,6 +11,29 @@ const BookList = () => {
     fetchBooks();
   }, [searchTerm]);
 
+  // Live copy counts for the books on screen (served in ASGI mode only)
+  const bookIds = books.map((book) => book.id).join(',');
+  useEffect(() => {
+    if (!bookIds || typeof EventSource === 'undefined') {
+      return undefined;
+    }
+    const source = new EventSource(
+      `${api.defaults.baseURL}/books/availability/stream/?books=${bookIds}`
+    );
+    const applyCounts = (event) => {
+      const counts = JSON.parse(event.data);
+      setBooks((current) =>
+        current.map((book) =>
+          counts[book.id] !== undefined ? { ...book, available_copies: counts[book.id] } : book
+        )
+      );
+    };
+    source.addEventListener('snapshot', applyCounts);
+    source.addEventListener('availability', applyCounts);
+    source.addEventListener('resync', () => fetchBooks());
+    return () => source.close();
+  }, [bookIds]);
+
   const fetchBooks = async () => {
     try {
       setLoading(true);
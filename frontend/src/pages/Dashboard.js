@@ -2,6 +2,11 @@ import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import api from '../services/api';
 
+const ISSUE_FIELDS =
+  'id,issue_date,due_date,status,book.title,member.user.first_name,member.user.last_name';
+
+const HOLD_FIELDS = 'id,status,queue_position,hold_expires_at,book.title';
+
 const Dashboard = () => {
   const [stats, setStats] = useState({
     totalBooks: 0,
@@ -11,6 +16,7 @@ const Dashboard = () => {
   });
   const [loading, setLoading] = useState(true);
   const [recentIssues, setRecentIssues] = useState([]);
+  const [holds, setHolds] = useState([]);
 
   useEffect(() => {
     fetchDashboardData();
@@ -18,23 +24,25 @@ const Dashboard = () => {
 
   const fetchDashboardData = async () => {
     try {
-      const [booksRes, availableRes, membersRes, issuesRes] = await Promise.all([
-        api.get('/books/'),
-        api.get('/books/available/'),
-        api.get('/members/'),
-        api.get('/issues/?status=issued'),
+      const [statsRes, issuesRes, holdsRes] = await Promise.all([
+        api.get('/stats/'),
+        api.get('/issues/', {
+          params: { status: 'issued', fields: ISSUE_FIELDS },
+        }),
+        api.get('/reservations/mine/', { params: { fields: HOLD_FIELDS } }),
       ]);
 
       setStats({
-        totalBooks: booksRes.data.count || booksRes.data.length,
-        availableBooks: availableRes.data.length,
-        totalMembers: membersRes.data.count || membersRes.data.length,
-        issuedBooks: issuesRes.data.count || issuesRes.data.length,
+        totalBooks: statsRes.data.total_books,
+        availableBooks: statsRes.data.available_books,
+        totalMembers: statsRes.data.total_members,
+        issuedBooks: statsRes.data.issued_books,
       });
 
       // Get recent issues
-      const recent = issuesRes.data.slice(0, 5);
+      const recent = (issuesRes.data.results || issuesRes.data).slice(0, 5);
       setRecentIssues(recent);
+      setHolds(holdsRes.data.results || holdsRes.data);
     } catch (error) {
       console.error('Error fetching dashboard data:', error);
     } finally {
@@ -115,6 +123,36 @@ const Dashboard = () => {
         )}
       </div>
 
+      {holds.length > 0 && (
+        <div className="card">
+          <h2>My Holds</h2>
+          <table className="table">
+            <thead>
+              <tr>
+                <th>Book</th>
+                <th>Status</th>
+              </tr>
+            </thead>
+            <tbody>
+              {holds.map((hold) => (
+                <tr key={hold.id}>
+                  <td>{hold.book.title}</td>
+                  <td>
+                    {hold.status === 'ready' ? (
+                      <span className="badge badge-available">
+                        Ready until {new Date(hold.hold_expires_at).toLocaleDateString()}
+                      </span>
+                    ) : (
+                      `#${hold.queue_position} in line`
+                    )}
+                  </td>
+                </tr>
+              ))}
+            </tbody>
+          </table>
+        </div>
+      )}
+
       <div style={{ marginTop: '20px' }}>
         <Link to="/books" className="btn btn-primary">
           View All Books
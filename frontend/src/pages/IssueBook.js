@@ -1,10 +1,13 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import api from '../services/api';
+import Typeahead from '../components/Typeahead';
+
+const formatBook = (book) =>
+  `${book.title} by ${book.author} (Available: ${book.available_copies})`;
+const formatMember = (member) => `${member.name} (${member.member_id})`;
 
 const IssueBook = () => {
-  const [books, setBooks] = useState([]);
-  const [members, setMembers] = useState([]);
   const [formData, setFormData] = useState({
     book_id: '',
     member_id: '',
@@ -13,25 +16,9 @@ const IssueBook = () => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
+  const [formKey, setFormKey] = useState(0);
   const navigate = useNavigate();
 
-  useEffect(() => {
-    fetchBooksAndMembers();
-  }, []);
-
-  const fetchBooksAndMembers = async () => {
-    try {
-      const [booksRes, membersRes] = await Promise.all([
-        api.get('/books/available/'),
-        api.get('/members/'),
-      ]);
-      setBooks(booksRes.data);
-      setMembers(membersRes.data.results || membersRes.data);
-    } catch (error) {
-      console.error('Error fetching data:', error);
-    }
-  };
-
   const handleChange = (e) => {
     setFormData({
       ...formData,
@@ -43,6 +30,10 @@ const IssueBook = () => {
     e.preventDefault();
     setError('');
     setSuccess('');
+    if (!formData.book_id || !formData.member_id) {
+      setError('Please select a book and a member from the suggestions');
+      return;
+    }
     setLoading(true);
 
     try {
@@ -57,7 +48,7 @@ const IssueBook = () => {
       await api.post('/issues/issue/', payload);
       setSuccess('Book issued successfully!');
       setFormData({ book_id: '', member_id: '', due_date: '' });
-      fetchBooksAndMembers();
+      setFormKey(formKey + 1);
       setTimeout(() => {
         navigate('/dashboard');
       }, 2000);
@@ -93,36 +84,26 @@ const IssueBook = () => {
           <form onSubmit={handleSubmit}>
             <div className="form-group">
               <label>Select Book</label>
-              <select
-                name="book_id"
-                value={formData.book_id}
-                onChange={handleChange}
-                required
-              >
-                <option value="">-- Select a book --</option>
-                {books.map((book) => (
-                  <option key={book.id} value={book.id}>
-                    {book.title} by {book.author} (Available: {book.available_copies})
-                  </option>
-                ))}
-              </select>
+              <Typeahead
+                key={`book-${formKey}`}
+                endpoint="/books/typeahead/"
+                placeholder="Search by title, author or ISBN"
+                formatItem={formatBook}
+                onSelect={(book) => setFormData((data) => ({ ...data, book_id: book ? book.id : '' }))}
+              />
             </div>
 
             <div className="form-group">
               <label>Select Member</label>
-              <select
-                name="member_id"
-                value={formData.member_id}
-                onChange={handleChange}
-                required
-              >
-                <option value="">-- Select a member --</option>
-                {members.map((member) => (
-                  <option key={member.id} value={member.id}>
-                    {member.user.first_name} {member.user.last_name} ({member.member_id})
-                  </option>
-                ))}
-              </select>
+              <Typeahead
+                key={`member-${formKey}`}
+                endpoint="/members/typeahead/"
+                placeholder="Search by name or member ID"
+                formatItem={formatMember}
+                onSelect={(member) =>
+                  setFormData((data) => ({ ...data, member_id: member ? member.id : '' }))
+                }
+              />
             </div>
 
             <div className="form-group">
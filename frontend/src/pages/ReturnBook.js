@@ -2,6 +2,9 @@ import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import api from '../services/api';
 
+const ISSUE_FIELDS =
+  'id,issue_date,due_date,status,book.title,member.user.first_name,member.user.last_name,member.member_id';
+
 const ReturnBook = () => {
   const [issues, setIssues] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -16,7 +19,9 @@ const ReturnBook = () => {
 
   const fetchIssues = async () => {
     try {
-      const response = await api.get('/issues/?status=issued');
+      const response = await api.get('/issues/', {
+        params: { status: 'issued', fields: ISSUE_FIELDS },
+      });
       setIssues(response.data.results || response.data);
     } catch (error) {
       console.error('Error fetching issues:', error);
@@ -37,8 +37,12 @@ api.interceptors.response.use(
             `${process.env.REACT_APP_API_URL || 'http://localhost:8000/api'}/token/refresh/`,
             { refresh: refreshToken }
           );
-          const { access } = response.data;
+          const { access, refresh } = response.data;
           localStorage.setItem('access_token', access);
+          // Refresh tokens rotate; the old one is blacklisted
+          if (refresh) {
+            localStorage.setItem('refresh_token', refresh);
+          }
           api.defaults.headers.common['Authorization'] = `Bearer ${access}`;
           originalRequest.headers.Authorization = `Bearer ${access}`;
           return api(originalRequest);